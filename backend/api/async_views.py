@@ -0,0 +1,24 @@
+from functools import wraps
+
+from recipes.concurrency import run_in_thread_pool
+
+
+def async_view(view):
+    """
+    Функция для превращения синхронного представления в асинхронное,
+    которое выполняется в пуле потоков. Ответ DRF отрисовывается
+    в том же потоке, что и представление
+    """
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    run = run_in_thread_pool(render)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return wrapper
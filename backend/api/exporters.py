@@ -0,0 +1,174 @@
+import csv
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .pdf import build_pdf, load_font
+
+logger = logging.getLogger(__name__)
+
+
+class ShoppingCartExporter:
+    """Базовый класс экспортёра списка покупок"""
+
+    format = None
+    content_type = None
+    extension = None
+
+    def __init__(self, ingredients, recipes, date):
+        self.ingredients = ingredients
+        self.recipes = recipes
+        self.date = date
+
+    def render(self):
+        """Метод должен возвращать итератор по частям файла"""
+        raise NotImplementedError
+
+
+class TextExporter(ShoppingCartExporter):
+    """Экспорт списка покупок в текстовый файл"""
+
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def lines(self):
+        yield f'Список покупок на {self.date}:'
+        yield 'Продукты:'
+        for number_of_product, item in enumerate(self.ingredients, start=1):
+            yield (
+                f'{number_of_product}. {item["name"].capitalize()} '
+                f'({item["measurement_unit"]}) - {item["amount"]}'
+            )
+        yield ''
+        yield 'Рецепты, для которых нужны эти продукты:'
+        for number_of_product, (recipe_name, author) in enumerate(
+            self.recipes,
+            start=1
+        ):
+            yield f'{number_of_product}. {recipe_name} (автор: {author})'
+
+    def render(self):
+        for number, line in enumerate(self.lines()):
+            yield f'\n{line}' if number else line
+
+
+class _Echo:
+    """Буфер, который отдаёт записанную строку вместо её хранения"""
+
+    def write(self, value):
+        return value
+
+
+class CSVExporter(ShoppingCartExporter):
+    """Экспорт списка продуктов в CSV"""
+
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self):
+        writer = csv.writer(_Echo())
+        # BOM нужен, чтобы Excel правильно определил кодировку
+        yield '\ufeff' + writer.writerow(
+            ('Продукт', 'Единица измерения', 'Количество')
+        )
+        for item in self.ingredients:
+            yield writer.writerow(
+                (item['name'], item['measurement_unit'], item['amount'])
+            )
+
+
+class JSONExporter(ShoppingCartExporter):
+    """Экспорт списка покупок в JSON"""
+
+    format = 'json'
+    content_type = 'application/json'
+    extension = 'json'
+
+    def _items(self, items):
+        for number, item in enumerate(items):
+            yield (',' if number else '') + json.dumps(
+                item, ensure_ascii=False
+            )
+
+    def render(self):
+        yield f'{{"date": {json.dumps(self.date)}, "ingredients": ['
+        yield from self._items(self.ingredients)
+        yield '], "recipes": ['
+        yield from self._items(
+            {'name': name, 'author': author} for name, author in self.recipes
+        )
+        yield ']}'
+
+
+class PDFExporter(TextExporter):
+    """Экспорт списка покупок в PDF
+
+    Стандартные шрифты PDF не содержат кириллицы, поэтому в файл
+    встраивается TrueType-шрифт из настроек, а строки выводятся
+    текстом, который можно выделять и искать.
+    """
+
+    format = 'pdf'
+    content_type = 'application/pdf'
+    extension = 'pdf'
+
+    # Лист A4 в пунктах
+    page_size = (595, 842)
+    margin = 42
+    font_size = 12
+    line_height = 17
+
+    def _load_font(self):
+        try:
+            return load_font(settings.SHOPPING_CART_PDF_FONT)
+        except OSError as error:
+            logger.error(
+                'Не удалось загрузить шрифт для PDF %s: %s',
+                settings.SHOPPING_CART_PDF_FONT, error
+            )
+            raise ImproperlyConfigured(
+                'Шрифт SHOPPING_CART_PDF_FONT не найден'
+            ) from error
+
+    def _wrap(self, line, font, width):
+        words = line.split(' ')
+        current = words[0]
+        for word in words[1:]:
+            if font.get_length(f'{current} {word}', self.font_size) > width:
+                yield current
+                current = word
+            else:
+                current = f'{current} {word}'
+        yield current
+
+    def render(self):
+        font = self._load_font()
+        width, height = self.page_size
+        lines_per_page = (height - 2 * self.margin) // self.line_height
+        lines = [
+            wrapped
+            for line in self.lines()
+            for wrapped in self._wrap(line, font, width - 2 * self.margin)
+        ]
+        # Строка выводится от базовой линии, координаты идут снизу
+        top = height - self.margin - self.font_size
+        pages = [
+            [
+                ((self.margin, top - number * self.line_height), line)
+                for number, line in enumerate(
+                    lines[start:start + lines_per_page]
+                )
+            ]
+            for start in range(0, len(lines), lines_per_page)
+        ]
+        yield build_pdf(pages, font, self.font_size, self.page_size)
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (TextExporter, CSVExporter, JSONExporter, PDFExporter)
+}
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    TemporaryUploadedFile,
+    UploadedFile,
+)
+from PIL import Image
+from rest_framework import serializers
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    Поле для загрузки картинки в base64. Строка декодируется частями
+    сразу во временный файл, а формат и размеры картинки проверяются
+    по заголовку до декодирования остальных данных
+    """
+
+    default_error_messages = {
+        'invalid': 'Картинка должна быть передана строкой base64.',
+        'invalid_image': 'Загруженный файл не является картинкой.',
+        'format': 'Допустимые форматы картинки: {formats}.',
+        'too_large': 'Размер картинки не должен превышать {max_size} МБ.',
+        'too_many_pixels': (
+            'Картинка слишком большая: {width}x{height} пикселей.'
+        ),
+    }
+    # Размер части строки base64. Пробелы и переносы строк из части
+    # отбрасываются, а остаток до кратной 4 длины переносится
+    # в следующую часть, чтобы части декодировались независимо
+    chunk_size = 64 * 1024
+    # Сколько байт картинки можно прочитать в поисках заголовка
+    header_limit = 1024 * 1024
+
+    def to_internal_value(self, data):
+        if data in ('', None):
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid')
+
+        header, separator, payload = data.partition(';base64,')
+        if not separator:
+            payload = data
+        if len(payload) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail(
+                'too_large',
+                max_size=settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)
+            )
+
+        upload = TemporaryUploadedFile(
+            name='upload', content_type=None, size=0, charset=None
+        )
+        try:
+            image_format = self._decode(payload, upload)
+            upload.seek(0)
+            try:
+                with Image.open(upload) as image:
+                    image.verify()
+            except Exception:
+                self.fail('invalid_image')
+        except Exception:
+            upload.close()
+            raise
+
+        upload.seek(0)
+        extension = {
+            'JPEG': 'jpg',
+        }.get(image_format, image_format.lower())
+        upload.name = f'{uuid.uuid4()}.{extension}'
+        upload.content_type = Image.MIME.get(image_format)
+        return upload
+
+    def _decode(self, payload, upload):
+        """
+        Метод для пошагового декодирования base64 во временный файл.
+        Возвращает формат картинки, определённый по заголовку
+        """
+        image_format = None
+        carry = ''
+        for start in range(0, len(payload), self.chunk_size):
+            is_last = start + self.chunk_size >= len(payload)
+            chunk = carry + ''.join(
+                payload[start:start + self.chunk_size].split()
+            )
+            end = len(chunk) if is_last else len(chunk) - len(chunk) % 4
+            chunk, carry = chunk[:end], chunk[end:]
+            try:
+                upload.write(base64.b64decode(chunk, validate=True))
+            except (binascii.Error, ValueError):
+                self.fail('invalid')
+            upload.size = upload.tell()
+
+            if image_format is None:
+                image_format = self._check_header(
+                    upload, force=is_last or upload.size >= self.header_limit
+                )
+        if image_format is None:
+            self.fail('invalid_image')
+        return image_format
+
+    def _check_header(self, upload, force):
+        """
+        Метод для проверки формата и размеров картинки по заголовку.
+        Если заголовок ещё не прочитан целиком, возвращает None
+        """
+        upload.flush()
+        upload.seek(0)
+        try:
+            with Image.open(upload.file) as image:
+                image_format = image.format
+                width, height = image.size
+        except Exception:
+            if force:
+                self.fail('invalid_image')
+            return None
+        finally:
+            upload.seek(0, 2)
+
+        if image_format not in settings.IMAGE_UPLOAD_FORMATS:
+            self.fail(
+                'format', formats=', '.join(settings.IMAGE_UPLOAD_FORMATS)
+            )
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.fail('too_many_pixels', width=width, height=height)
+        return image_format
+
+
+class CloseUploadsMixin:
+    """
+    Миксин для сериалайзеров с полем Base64ImageField. Временный файл
+    картинки закрывается после сохранения модели, даже неудачного
+    """
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            for value in self.validated_data.values():
+                if isinstance(value, UploadedFile):
+                    value.close()
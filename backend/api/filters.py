@@ -0,0 +1,107 @@
+from django.db.models import Count, Exists, OuterRef
+from recipes.models import IngredientInRecipe
+from recipes.search import search_recipes
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# Сортировки рецептов; у каждой есть индекс, совпадающий с ней
+RECIPE_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def get_ids(request, param):
+    """
+    Функция для чтения идентификаторов из параметра запроса,
+    переданных через запятую или повтором параметра
+    """
+    try:
+        return {
+            int(value)
+            for values in request.query_params.getlist(param)
+            for value in values.split(',') if value.strip()
+        }
+    except ValueError:
+        raise ValidationError(
+            {param: 'Ожидаются целые идентификаторы продуктов'}
+        )
+
+
+def get_recipe_ordering(request):
+    """Функция для чтения сортировки рецептов из параметра ordering"""
+    ordering = request.query_params.get('ordering') or 'newest'
+    if ordering not in RECIPE_ORDERINGS:
+        raise ValidationError({'ordering': (
+            f'Доступные сортировки: {", ".join(RECIPE_ORDERINGS)}'
+        )})
+    return RECIPE_ORDERINGS[ordering]
+
+
+class RecipeFilterBackend(BaseFilterBackend):
+    """
+    Фильтрация рецептов по продуктам, времени приготовления
+    и тексту названия и описания.
+    Идентификаторы продуктов передаются через запятую или повтором
+    параметра: ingredients — все продукты, ingredients_any — хотя бы
+    один из них, exclude_ingredients — ни одного из них
+    """
+
+    def get_number(self, request, param):
+        value = request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({param: 'Ожидается целое число минут'})
+
+    def filter_queryset(self, request, queryset, view):
+        include_all = get_ids(request, 'ingredients')
+        if include_all:
+            # Рецепт подходит, если в нём нашлись все продукты из списка
+            queryset = queryset.filter(id__in=(
+                IngredientInRecipe.objects
+                .filter(ingredient_id__in=include_all)
+                .values('recipe_id')
+                .annotate(found=Count('ingredient_id'))
+                .filter(found=len(include_all))
+                .values('recipe_id')
+            ))
+        include_any = get_ids(request, 'ingredients_any')
+        if include_any:
+            queryset = queryset.filter(Exists(
+                IngredientInRecipe.objects.filter(
+                    recipe_id=OuterRef('pk'), ingredient_id__in=include_any
+                )
+            ))
+        exclude = get_ids(request, 'exclude_ingredients')
+        if exclude:
+            queryset = queryset.exclude(Exists(
+                IngredientInRecipe.objects.filter(
+                    recipe_id=OuterRef('pk'), ingredient_id__in=exclude
+                )
+            ))
+
+        cooking_time_min = self.get_number(request, 'cooking_time_min')
+        if cooking_time_min is not None:
+            queryset = queryset.filter(cooking_time__gte=cooking_time_min)
+        cooking_time_max = self.get_number(request, 'cooking_time_max')
+        if cooking_time_max is not None:
+            queryset = queryset.filter(cooking_time__lte=cooking_time_max)
+
+        search = request.query_params.get('search', '').strip()
+        if search:
+            queryset = search_recipes(queryset, search)
+        return queryset
+
+
+class RecipeOrderingBackend(BaseFilterBackend):
+    """
+    Сортировка рецептов: newest — от новых к старым, popular — по числу
+    добавлений в избранное, trending — по популярности за последнее время
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(*get_recipe_ordering(request))
@@ -0,0 +1,209 @@
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.cache import invalidate_shopping_carts
+from recipes.models import Recipe, User
+from rest_framework.test import APIClient
+
+BASELINE_PATH = os.path.join(
+    settings.BASE_DIR, 'api', 'benchmark_baseline.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер количества SQL-запросов, времени ответа и пикового "
+        "потребления памяти эндпоинтами API со сравнением с эталоном. "
+        "По умолчанию с эталоном сравнивается только количество запросов: "
+        "время и память зависят от машины"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument(
+            '--timings', action='store_true',
+            help=(
+                'Сравнивать и сохранять в эталон время и память. '
+                'Эталон должен быть снят на той же машине'
+            )
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=3.0,
+            help='Во сколько раз время и память могут превышать эталон'
+        )
+        parser.add_argument('--baseline', default=BASELINE_PATH)
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Сохранить результаты замеров как новый эталон'
+        )
+
+    def get_endpoints(self, limit, user):
+        """
+        Метод возвращает эндпоинты: нужна ли авторизация, адрес
+        и функция, которая вызывается перед каждым замеряемым запросом
+        """
+        recipe = Recipe.objects.order_by('id').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет данных для замеров, выполните seed_benchmark_data'
+            )
+        shopping_cart_url = '/api/recipes/download_shopping_cart/'
+        return {
+            'recipes_list_anonymous': (
+                False, f'/api/recipes/?limit={limit}', None
+            ),
+            'recipes_list': (True, f'/api/recipes/?limit={limit}', None),
+            'recipes_detail': (True, f'/api/recipes/{recipe.id}/', None),
+            'subscriptions': (
+                True, f'/api/users/subscriptions/?limit={limit}', None
+            ),
+            'subscriptions_recipes_limit': (
+                True,
+                f'/api/users/subscriptions/?limit={limit}&recipes_limit=3',
+                None
+            ),
+            'recipes_feed': (True, f'/api/recipes/feed/?limit={limit}', None),
+            'ingredients_list': (False, '/api/ingredients/', None),
+            'ingredients_search': (False, '/api/ingredients/?name=мо', None),
+            # Список покупок кэшируется, поэтому построение списка
+            # и выдача из кэша замеряются отдельно
+            'download_shopping_cart': (
+                True, shopping_cart_url,
+                lambda: invalidate_shopping_carts([user.id])
+            ),
+            'download_shopping_cart_cached': (True, shopping_cart_url, None),
+        }
+
+    def get_user(self):
+        user = (
+            User.objects.filter(shoppingcarts__isnull=False,
+                                users__isnull=False)
+            .order_by('id')
+            .first()
+        )
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с подписками и корзиной, '
+                'выполните seed_benchmark_data'
+            )
+        return user
+
+    def fetch(self, client, url):
+        """Метод для выполнения запроса с чтением всего тела ответа"""
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'{url} вернул {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def measure(self, client, url, repeat, prepare=None):
+        """Метод для замера одного эндпоинта"""
+        prepare = prepare or (lambda: None)
+        prepare()
+        self.fetch(client, url)
+
+        # Трассировка памяти замедляет ответ, поэтому время
+        # замеряется отдельно от запросов и памяти
+        timings = []
+        for _ in range(repeat):
+            prepare()
+            started = time.perf_counter()
+            self.fetch(client, url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        prepare()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as context:
+            self.fetch(client, url)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        percentiles = statistics.quantiles(timings, n=100)
+        return {
+            'queries': len(context.captured_queries),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentiles[94], 2),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
+
+    def compare(self, name, result, baseline, tolerance, timings):
+        """Метод для поиска превышений эталона"""
+        regressions = []
+        if name not in baseline:
+            return regressions
+        expected = baseline[name]
+        if result['queries'] > expected['queries']:
+            regressions.append(
+                f'{name}: запросов {result["queries"]} '
+                f'(эталон {expected["queries"]})'
+            )
+        if not timings:
+            return regressions
+        for metric in ('p50_ms', 'p95_ms', 'peak_memory_kb'):
+            if metric not in expected:
+                continue
+            if result[metric] > expected[metric] * tolerance:
+                regressions.append(
+                    f'{name}: {metric} {result[metric]} '
+                    f'(эталон {expected[metric]})'
+                )
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 2:
+            raise CommandError('Количество повторов должно быть не меньше 2')
+
+        anonymous = APIClient(SERVER_NAME='localhost')
+        authorized = APIClient(SERVER_NAME='localhost')
+        user = self.get_user()
+        authorized.force_authenticate(user)
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        results = {}
+        regressions = []
+        endpoints = self.get_endpoints(options['limit'], user)
+        for name, (auth, url, prepare) in endpoints.items():
+            results[name] = self.measure(
+                authorized if auth else anonymous, url, options['repeat'],
+                prepare
+            )
+            self.stdout.write(
+                f'{name:<30} запросов {results[name]["queries"]:>4}  '
+                f'p50 {results[name]["p50_ms"]:>8} мс  '
+                f'p95 {results[name]["p95_ms"]:>8} мс  '
+                f'память {results[name]["peak_memory_kb"]:>9} КБ'
+            )
+            regressions += self.compare(
+                name, results[name], baseline, options['tolerance'],
+                options['timings']
+            )
+
+        if options['update_baseline']:
+            if not options['timings']:
+                results = {
+                    name: {'queries': result['queries']}
+                    for name, result in results.items()
+                }
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+                file.write('\n')
+            self.stdout.write(self.style.SUCCESS('Эталон обновлён'))
+            return
+
+        if regressions:
+            raise CommandError(
+                'Превышен эталон:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Эталон не превышен'))
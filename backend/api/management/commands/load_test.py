@@ -0,0 +1,126 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/ingredients/',
+    '/api/ingredients/?name=мо',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест запущенных серверов: пропускная способность "
+        "и время ответа эндпоинтов чтения при заданном числе "
+        "одновременных клиентов. Несколько серверов, например в режимах "
+        "wsgi и asgi, сравниваются в одной таблице"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='+', metavar='NAME=URL',
+            help='Серверы, например wsgi=http://localhost:8000'
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность теста каждого сервера в секундах'
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Путь запроса, можно указать несколько раз'
+        )
+        parser.add_argument(
+            '--token', help='Токен для авторизованных запросов'
+        )
+
+    def parse_targets(self, targets):
+        parsed = []
+        for target in targets:
+            name, separator, url = target.partition('=')
+            if not separator or not url.startswith(('http://', 'https://')):
+                raise CommandError(
+                    f'Ожидается NAME=URL, получено: {target}'
+                )
+            parsed.append((name, url.rstrip('/')))
+        return parsed
+
+    def run_client(self, url, paths, headers, deadline, timings, errors):
+        """Метод для отправки запросов одним клиентом до конца теста"""
+        session = requests.Session()
+        session.headers.update(headers)
+        position = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.get(url + paths[position % len(paths)])
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                if ok:
+                    timings.append(elapsed)
+                else:
+                    errors.append(elapsed)
+            position += 1
+
+    def run_target(self, url, paths, headers, concurrency, duration):
+        """Метод для нагрузочного теста одного сервера"""
+        timings, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(
+                    self.run_client, url, paths, headers,
+                    deadline, timings, errors
+                )
+        elapsed = time.perf_counter() - started
+        if len(timings) < 2:
+            raise CommandError(f'{url}: нет успешных ответов')
+        percentiles = statistics.quantiles(timings, n=100)
+        return {
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+            'errors': len(errors),
+        }
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('Число клиентов должно быть не меньше 1')
+        self.lock = threading.Lock()
+        paths = options['paths'] or list(DEFAULT_PATHS)
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        results = {}
+        for name, url in self.parse_targets(options['targets']):
+            results[name] = self.run_target(
+                url, paths, headers,
+                options['concurrency'], options['duration']
+            )
+            result = results[name]
+            self.stdout.write(
+                f'{name:<10} запросов/с {result["rps"]:>8}  '
+                f'p50 {result["p50_ms"]:>8} мс  '
+                f'p95 {result["p95_ms"]:>8} мс  '
+                f'p99 {result["p99_ms"]:>8} мс  '
+                f'ошибок {result["errors"]:>5}'
+            )
+
+        if len(results) > 1:
+            base_name, base = next(iter(results.items()))
+            for name, result in list(results.items())[1:]:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: пропускная способность '
+                    f'{result["rps"] / base["rps"]:.2f}× от {base_name}'
+                ))
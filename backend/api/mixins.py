@@ -0,0 +1,82 @@
+import hashlib
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_vary_headers,
+    quote_etag,
+)
+from recipes.replicas import use_replicas
+from recipes.versions import get_table_versions, user_relations_table
+from rest_framework.permissions import SAFE_METHODS
+
+
+class ConditionalGetMixin:
+    """
+    Миксин для условных GET-запросов: ETag строится по версиям таблиц,
+    поэтому на неизменившиеся данные возвращается ответ 304 без
+    обращения к сериализаторам. Last-Modified не отдаётся: его точность
+    в одну секунду не различает изменения внутри одной секунды
+    """
+
+    version_tables = ()
+    # Выдача зависит от пользователя, например флаги избранного.
+    # Тогда в ETag входит и версия связей пользователя с рецептами
+    vary_on_user = True
+
+    def get_version_tables(self, request):
+        """
+        Метод возвращает таблицы, от версий которых зависит выдача,
+        или None, если условные запросы для неё не поддерживаются
+        """
+        tables = list(self.version_tables)
+        if self.vary_on_user and request.user.is_authenticated:
+            tables.append(user_relations_table(request.user.pk))
+        return tables
+
+    def get_etag(self, request, tables):
+        versions = get_table_versions(tables)
+        parts = [
+            *(str(version) for version, _ in versions),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ]
+        if self.vary_on_user:
+            parts.append(str(request.user.pk))
+        return quote_etag(
+            hashlib.md5(':'.join(parts).encode()).hexdigest()
+        )
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        tables = self.get_version_tables(request)
+        if tables is None:
+            return handler(request, *args, **kwargs)
+        etag = self.get_etag(request, tables)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        if self.vary_on_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ReadReplicaMixin:
+    """
+    Миксин для чтения с реплик БД: безопасные запросы читают данные
+    с реплик, пока не выполнят запись, остальные работают с основной БД
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replicas(request.method in SAFE_METHODS):
+            return super().dispatch(request, *args, **kwargs)
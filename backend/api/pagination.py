@@ -1,4 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class PagesPagination(PageNumberPagination):
@@ -7,3 +17,148 @@ class PagesPagination(PageNumberPagination):
     page_query_param = 'page'
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetPagination(BasePagination):
+    """
+    Класс курсорной пагинации. Следующая страница ищется по значениям
+    полей сортировки последней записи, поэтому запрос не использует
+    OFFSET, а общее количество считается только по параметру count=1
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+    page_size = 6
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering=('-created_at', '-id')):
+        self.ordering = ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        """
+        Метод для чтения курсора. Значения приводятся к типам полей
+        сортировки модели, чтобы неверный курсор не доходил до запроса
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.ordering)
+                or None in values
+            ):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            values.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def get_seek_filter(self, values):
+        """
+        Метод для построения условия «строго после курсора»
+        в лексикографическом порядке полей сортировки
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == '1':
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(cursor))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def paginate_with(self, fetch, request, model):
+        """
+        Метод для пагинации записей модели model, которые возвращает
+        функция fetch(cursor, size), например ленты из нескольких выборок
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        page = fetch(self.decode_cursor(request, model), self.page_size + 1)
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(PagesPagination):
+    """
+    Класс постраничной пагинации с переходом на курсорную.
+    Курсорная включается параметром cursor, для первой страницы
+    он передаётся пустым: ?cursor=
+    """
+
+    keyset_ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(
+                getattr(view, 'keyset_ordering', self.keyset_ordering)
+            )
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
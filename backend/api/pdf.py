@@ -0,0 +1,268 @@
+import os
+import re
+import struct
+import zlib
+from functools import lru_cache
+
+
+class TrueTypeFont:
+    """
+    Класс TrueType-шрифта для встраивания в PDF. Из файла читаются
+    только таблицы, нужные для вывода текста: соответствие символов
+    глифам, ширины глифов и общие метрики
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = file.read()
+        # Имя шрифта в PDF берётся из имени файла
+        self.name = re.sub(
+            r'[^A-Za-z0-9-]', '', os.path.splitext(os.path.basename(path))[0]
+        ) or 'Font'
+        self.tables = {}
+        [count] = struct.unpack_from('>H', self.data, 4)
+        for number in range(count):
+            tag, _, offset, _ = struct.unpack_from(
+                '>4sLLL', self.data, 12 + 16 * number
+            )
+            self.tables[tag.decode('latin-1')] = offset
+
+        head = self.tables['head']
+        [self.units_per_em] = struct.unpack_from('>H', self.data, head + 18)
+        self.bbox = struct.unpack_from('>4h', self.data, head + 36)
+        hhea = self.tables['hhea']
+        self.ascent, self.descent = struct.unpack_from(
+            '>2h', self.data, hhea + 4
+        )
+        [metrics_count] = struct.unpack_from('>H', self.data, hhea + 34)
+        self.advances = [
+            advance for advance, _ in struct.iter_unpack(
+                '>Hh', self.data[
+                    self.tables['hmtx']:
+                    self.tables['hmtx'] + 4 * metrics_count
+                ]
+            )
+        ]
+        self.glyphs = self._read_cmap()
+        self._file_stream = None
+
+    def _read_cmap(self):
+        cmap = self.tables['cmap']
+        [count] = struct.unpack_from('>H', self.data, cmap + 2)
+        subtables = {}
+        for number in range(count):
+            platform, encoding, offset = struct.unpack_from(
+                '>HHL', self.data, cmap + 4 + 8 * number
+            )
+            subtables[platform, encoding] = cmap + offset
+        # Таблица полного Юникода предпочтительнее таблицы BMP
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            if key in subtables:
+                offset = subtables[key]
+                [table_format] = struct.unpack_from('>H', self.data, offset)
+                if table_format == 12:
+                    return self._read_cmap_format_12(offset)
+                if table_format == 4:
+                    return self._read_cmap_format_4(offset)
+        raise ValueError('В шрифте нет таблицы символов Юникода')
+
+    def _read_cmap_format_4(self, offset):
+        [segments] = struct.unpack_from('>H', self.data, offset + 6)
+        segments //= 2
+        ends = offset + 14
+        starts = ends + 2 * segments + 2
+        deltas = starts + 2 * segments
+        range_offsets = deltas + 2 * segments
+        glyphs = {}
+        for number in range(segments):
+            [end] = struct.unpack_from('>H', self.data, ends + 2 * number)
+            [start] = struct.unpack_from('>H', self.data, starts + 2 * number)
+            [delta] = struct.unpack_from('>h', self.data, deltas + 2 * number)
+            position = range_offsets + 2 * number
+            [range_offset] = struct.unpack_from('>H', self.data, position)
+            for char in range(start, min(end, 0xFFFE) + 1):
+                if range_offset == 0:
+                    glyph = (char + delta) & 0xFFFF
+                else:
+                    [glyph] = struct.unpack_from(
+                        '>H', self.data,
+                        position + range_offset + 2 * (char - start)
+                    )
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph:
+                    glyphs[char] = glyph
+        return glyphs
+
+    def _read_cmap_format_12(self, offset):
+        [groups] = struct.unpack_from('>L', self.data, offset + 12)
+        glyphs = {}
+        for start, end, glyph in struct.iter_unpack(
+            '>3L', self.data[offset + 16:offset + 16 + 12 * groups]
+        ):
+            for char in range(start, end + 1):
+                glyphs[char] = glyph + char - start
+        return glyphs
+
+    def get_glyph(self, char):
+        return self.glyphs.get(ord(char), 0)
+
+    def get_advance(self, glyph):
+        """Метод для получения ширины глифа в тысячных долях кегля"""
+        advance = self.advances[min(glyph, len(self.advances) - 1)]
+        return advance * 1000 / self.units_per_em
+
+    def get_length(self, text, size):
+        """Метод для получения ширины строки в пунктах"""
+        return sum(
+            self.get_advance(self.get_glyph(char)) for char in text
+        ) * size / 1000
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    @property
+    def file_stream(self):
+        """Сжатый файл шрифта: сжимается один раз на процесс"""
+        if self._file_stream is None:
+            self._file_stream = zlib.compress(self.data)
+        return self._file_stream
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    """Функция для загрузки шрифта один раз на процесс"""
+    return TrueTypeFont(path)
+
+
+def _hex(glyphs):
+    return ''.join(f'{glyph:04X}' for glyph in glyphs)
+
+
+def _to_unicode(chars):
+    """
+    Функция для построения таблицы соответствия глифов символам,
+    по которой программы просмотра копируют и ищут текст
+    """
+    entries = sorted(chars.items())
+    blocks = []
+    for start in range(0, len(entries), 100):
+        block = entries[start:start + 100]
+        blocks.append(f'{len(block)} beginbfchar')
+        blocks.extend(
+            f'<{glyph:04X}> <{char.encode("utf-16-be").hex().upper()}>'
+            for glyph, char in block
+        )
+        blocks.append('endbfchar')
+    return '\n'.join((
+        '/CIDInit /ProcSet findresource begin',
+        '12 dict begin',
+        'begincmap',
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        '/Supplement 0 >> def',
+        '/CMapName /Adobe-Identity-UCS def',
+        '/CMapType 2 def',
+        '1 begincodespacerange',
+        '<0000> <FFFF>',
+        'endcodespacerange',
+        *blocks,
+        'endcmap',
+        'CMapName currentdict /CIDInit /ProcSet findresource '
+        'defineresource pop',
+        'end',
+        'end',
+    )).encode()
+
+
+def build_pdf(pages, font, font_size, page_size):
+    """
+    Функция для сборки PDF с текстом, набранным встроенным шрифтом.
+    pages - список страниц, страница - список строк с координатами
+    (x, y) от левого нижнего угла в пунктах
+    """
+    objects = []
+
+    def add(body, stream=None):
+        """Добавление объекта, у потока body - записи его словаря"""
+        if stream is None:
+            objects.append(body.encode())
+        else:
+            objects.append(
+                f'<< {body} /Filter /FlateDecode /Length {len(stream)} >>'
+                .encode() + b'\nstream\n' + stream + b'\nendstream'
+            )
+        return len(objects)
+
+    used = {}
+    contents = []
+    for lines in pages:
+        commands = []
+        for (x, y), text in lines:
+            glyphs = [font.get_glyph(char) for char in text]
+            for char, glyph in zip(text, glyphs):
+                if glyph:
+                    used.setdefault(glyph, char)
+            commands.append(
+                f'BT /F1 {font_size} Tf {x:.2f} {y:.2f} Td '
+                f'<{_hex(glyphs)}> Tj ET'
+            )
+        contents.append(zlib.compress('\n'.join(commands).encode()))
+
+    # Словарь страниц заполняется, когда известны все страницы
+    pages_id = add('')
+    catalog = add(f'<< /Type /Catalog /Pages {pages_id} 0 R >>')
+    font_file = add(f'/Length1 {len(font.data)}', font.file_stream)
+    x_min, y_min, x_max, y_max = (font.scale(value) for value in font.bbox)
+    descriptor = add(
+        f'<< /Type /FontDescriptor /FontName /{font.name} /Flags 32 '
+        f'/FontBBox [{x_min} {y_min} {x_max} {y_max}] /ItalicAngle 0 '
+        f'/Ascent {font.scale(font.ascent)} '
+        f'/Descent {font.scale(font.descent)} '
+        f'/CapHeight {font.scale(font.ascent)} /StemV 80 '
+        f'/FontFile2 {font_file} 0 R >>'
+    )
+    widths = ' '.join(
+        f'{glyph} [{round(font.get_advance(glyph))}]' for glyph in sorted(used)
+    )
+    cid_font = add(
+        f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{font.name} '
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+        '/Supplement 0 >> '
+        f'/FontDescriptor {descriptor} 0 R /CIDToGIDMap /Identity '
+        f'/DW {round(font.get_advance(0))} /W [{widths}] >>'
+    )
+    to_unicode = add('', zlib.compress(_to_unicode(used)))
+    type0_font = add(
+        f'<< /Type /Font /Subtype /Type0 /BaseFont /{font.name} '
+        f'/Encoding /Identity-H /DescendantFonts [{cid_font} 0 R] '
+        f'/ToUnicode {to_unicode} 0 R >>'
+    )
+    width, height = page_size
+    kids = []
+    for content in contents:
+        stream = add('', content)
+        kids.append(add(
+            f'<< /Type /Page /Parent {pages_id} 0 R '
+            f'/MediaBox [0 0 {width} {height}] '
+            f'/Resources << /Font << /F1 {type0_font} 0 R >> >> '
+            f'/Contents {stream} 0 R >>'
+        ))
+    objects[pages_id - 1] = (
+        f'<< /Type /Pages /Count {len(kids)} '
+        f'/Kids [{" ".join(f"{kid} 0 R" for kid in kids)}] >>'
+    ).encode()
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        output += f'{offset:010d} 00000 n \n'.encode()
+    output += (
+        f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R '
+        f'>>\nstartxref\n{xref}\n%%EOF\n'
+    ).encode()
+    return bytes(output)
@@ -1,6 +1,11 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from recipes.cache import get_recipe_fragment, set_recipe_fragment
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -12,8 +17,26 @@ from recipes.models import (
 )
 from rest_framework import serializers
 
+from .fields import Base64ImageField, CloseUploadsMixin
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Поле со ссылками на уменьшенные копии картинки рецепта"""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in variants.items():
+            if variant == 'source':
+                continue
+            url = default_storage.url(name)
+            urls[variant] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
+
 
-class UserSerializer(DjoserUserSerializer):
+class UserSerializer(CloseUploadsMixin, DjoserUserSerializer):
     """Сериалайзер для получения пользователей с дополнительными полями"""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -27,6 +50,8 @@ class UserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
         request_user = self.context['request'].user
         return Subscription.objects.filter(
             author=user.id,
@@ -42,13 +67,40 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class IngredientInRecipeListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка продуктов рецепта: все продукты проверяются
+    одним запросом, а вместо идентификаторов подставляются объекты
+    """
+
+    def validate(self, items):
+        ids = [item['ingredient']['id'] for item in items]
+        ingredients = Ingredient.objects.in_bulk(ids)
+        errors = []
+        missing = sorted(set(ids) - ingredients.keys())
+        if missing:
+            errors.append(
+                f'Продукты не найдены: {", ".join(map(str, missing))}'
+            )
+        repeated = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1
+        )
+        if repeated:
+            errors.append(
+                f'Продукты повторяются: {", ".join(map(str, repeated))}'
+            )
+        if errors:
+            raise serializers.ValidationError({'id': errors})
+        for item in items:
+            item['ingredient'] = ingredients[item['ingredient']['id']]
+        return items
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сераилайзер для получения ингредиентов в рецепте"""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient.id'
-    )
+    # Продукты проверяются одним запросом в IngredientInRecipeListSerializer
+    id = serializers.IntegerField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
@@ -58,9 +110,10 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = IngredientInRecipeListSerializer
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(CloseUploadsMixin, serializers.ModelSerializer):
     """Сериалайзер для работы с рецептами"""
 
     author = UserSerializer(read_only=True)
@@ -70,6 +123,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -78,6 +132,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'name',
             'text',
             'image',
+            'image_variants',
             'author',
             'cooking_time',
             'ingredients',
@@ -85,29 +140,89 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
         )
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, 'is_subscribed_to_author'):
+            recipe.author.is_subscribed = recipe.is_subscribed_to_author
+
+        # Всё, кроме флагов текущего пользователя, одинаково для всех
+        # и берётся из кэша, пока рецепт не изменился. Варианты картинки
+        # обновляются фоновой обработкой без смены updated_at, поэтому
+        # тоже входят в версию
+        request = self.context.get('request')
+        version = (
+            recipe.updated_at.isoformat(),
+            recipe.image.name,
+            sorted(recipe.image_variants.items()),
+            request.build_absolute_uri('/') if request else '',
+        )
+        data = get_recipe_fragment(recipe.id, version)
+        if data is None:
+            data = super().to_representation(recipe)
+            set_recipe_fragment(recipe.id, version, data)
+            return data
+
+        data['is_favorited'] = self.get_is_favorited(recipe)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(recipe)
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(recipe.author)
+        )
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients')
         recipe = super().create(validated_data)
         self._save_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('recipe_ingredients')
-        instance.ingredients.clear()
-        self._save_ingredients(instance, ingredients_data)
+        # При частичном изменении продукты могут не передаваться
+        ingredients_data = validated_data.pop('recipe_ingredients', None)
+        if ingredients_data is not None:
+            # Блокировка рецепта не даёт параллельным изменениям
+            # вычислить разницу по одним и тем же строкам
+            Recipe.objects.select_for_update().only('id').get(pk=instance.pk)
+            self._save_ingredients(
+                instance, ingredients_data,
+                IngredientInRecipe.objects.filter(recipe=instance)
+            )
+        # Рецепт сохраняется и при изменении одних продуктов:
+        # по updated_at обновляются кэши и индексы рецептов
         return super().update(instance, validated_data)
 
-    def _save_ingredients(self, recipe, ingredients_data):
+    def _save_ingredients(self, recipe, ingredients_data, rows=()):
+        """
+        Метод для сохранения продуктов рецепта по разнице с текущими
+        строками rows: меняются только изменившиеся количества,
+        добавляются новые и удаляются убранные продукты
+        """
+        amounts = {
+            item['ingredient'].id: (item['ingredient'], item['amount'])
+            for item in ingredients_data
+        }
+        removed, changed = [], []
+        for row in rows:
+            if row.ingredient_id not in amounts:
+                removed.append(row.id)
+                continue
+            _, amount = amounts.pop(row.ingredient_id)
+            if row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if removed:
+            IngredientInRecipe.objects.filter(id__in=removed).delete()
+        IngredientInRecipe.objects.bulk_update(changed, ['amount'])
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
-                recipe=recipe,
-                ingredient=ingredient['ingredient']['id'],
-                amount=ingredient['amount']
+                recipe=recipe, ingredient=ingredient, amount=amount
             )
-            for ingredient in ingredients_data
+            for ingredient, amount in amounts.values()
         )
 
-    def _check_existence(self, model, recipe):
+    def _check_existence(self, model, recipe, annotation):
+        if hasattr(recipe, annotation):
+            return getattr(recipe, annotation)
         request = self.context.get('request')
         return (
             request.user.is_authenticated
@@ -118,18 +233,22 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, recipe):
-        return self._check_existence(Favorite, recipe)
+        return self._check_existence(Favorite, recipe, 'is_favorited')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._check_existence(ShoppingCart, recipe)
+        return self._check_existence(
+            ShoppingCart, recipe, 'is_in_shopping_cart'
+        )
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого отображения рецепта."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -138,9 +257,7 @@ class SubscribedUserSerializer(UserSerializer):
     на которых подписан текущий пользователь"""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(
-        source='author.recipes.count'
-    )
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -150,13 +267,18 @@ class SubscribedUserSerializer(UserSerializer):
         )
 
     def get_recipes(self, author):
-        return ShortRecipeSerializer(
-            author.recipes.all()[:int(self.context.get('request').GET.get(
-                'recipes_limit',
-                10**10
-            ))],
-            many=True
-        ).data
+        if hasattr(author, 'limited_recipes'):
+            return ShortRecipeSerializer(
+                author.limited_recipes, many=True
+            ).data
+        recipes = author.recipes.all()
+        try:
+            recipes = recipes[:int(
+                self.context['request'].query_params['recipes_limit']
+            )]
+        except (KeyError, ValueError):
+            pass
+        return ShortRecipeSerializer(recipes, many=True).data
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -167,3 +289,16 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ('user', 'author')
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка идентификаторов для массовых изменений"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_ITEMS
+    )
+
+    def validate_ids(self, ids):
+        # Повторы убираются с сохранением порядка
+        return list(dict.fromkeys(ids))
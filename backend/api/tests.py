@@ -0,0 +1,414 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from recipes import connections as db_connections
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    User,
+)
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+
+def create_recipe(author, name='Рецепт', **kwargs):
+    """Функция для создания рецепта без загрузки картинки"""
+    return Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image='recipes/images/test.png', **kwargs
+    )
+
+
+def make_connection(usable=True, in_atomic_block=False):
+    """Функция для создания заглушки открытого соединения с БД"""
+    wrapper = mock.Mock(in_atomic_block=in_atomic_block)
+    wrapper.is_usable.return_value = usable
+    return wrapper
+
+
+@override_settings(DB_CONN_HEALTH_CHECKS=True)
+class CheckConnectionsTests(SimpleTestCase):
+    """Тесты проверки постоянных соединений перед запросом"""
+
+    def check(self, *connections):
+        with mock.patch.object(db_connections, 'connections') as handler:
+            handler.all.return_value = connections
+            before = db_connections.get_connection_metrics()
+            db_connections.check_connections()
+            after = db_connections.get_connection_metrics()
+        return {
+            key: after[key] - before[key]
+            for key in ('health_checks', 'unusable_connections')
+        }
+
+    def test_unusable_connection_is_closed(self):
+        wrapper = make_connection(usable=False)
+        self.assertEqual(
+            self.check(wrapper),
+            {'health_checks': 1, 'unusable_connections': 1}
+        )
+        wrapper.close.assert_called_once_with()
+
+    def test_usable_connection_is_kept(self):
+        wrapper = make_connection()
+        self.assertEqual(
+            self.check(wrapper),
+            {'health_checks': 1, 'unusable_connections': 0}
+        )
+        wrapper.close.assert_not_called()
+
+    def test_closed_and_atomic_connections_are_skipped(self):
+        closed = make_connection(usable=False)
+        closed.connection = None
+        atomic = make_connection(usable=False, in_atomic_block=True)
+        self.assertEqual(
+            self.check(closed, atomic),
+            {'health_checks': 0, 'unusable_connections': 0}
+        )
+        closed.close.assert_not_called()
+        atomic.close.assert_not_called()
+
+    @override_settings(DB_CONN_HEALTH_CHECKS=False)
+    def test_disabled_checks(self):
+        wrapper = make_connection(usable=False)
+        self.assertEqual(
+            self.check(wrapper),
+            {'health_checks': 0, 'unusable_connections': 0}
+        )
+        wrapper.close.assert_not_called()
+
+
+class ConnectionMetricsTests(SimpleTestCase):
+    """Тесты учёта ожидания потоков пула"""
+
+    def test_pool_waits(self):
+        before = db_connections.get_connection_metrics()
+        db_connections.record_pool_wait(5.0)
+        db_connections.record_pool_wait(1.0)
+        after = db_connections.get_connection_metrics()
+        self.assertEqual(after['pool_waits'] - before['pool_waits'], 2)
+        self.assertAlmostEqual(
+            after['pool_wait_ms_total'] - before['pool_wait_ms_total'], 6.0
+        )
+        self.assertGreaterEqual(after['pool_wait_ms_max'], 5.0)
+        self.assertAlmostEqual(
+            after['pool_wait_ms_avg'],
+            after['pool_wait_ms_total'] / after['pool_waits'],
+            places=1
+        )
+
+
+class DatabaseMetricsViewTests(APITestCase):
+    """Тесты эндпоинта метрик соединений с БД"""
+
+    url = reverse('metrics-db')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password'
+        )
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        )
+
+    def test_anonymous_is_rejected(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_gets_metrics(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(response.data),
+            {
+                'pid', 'server_mode', 'conn_max_age', 'health_checks_enabled',
+                'pool_size', 'connections_created', 'health_checks',
+                'unusable_connections', 'pool_waits', 'pool_wait_ms_total',
+                'pool_wait_ms_max', 'pool_wait_ms_avg',
+            }
+        )
+
+
+@override_settings(DB_CONN_HEALTH_CHECKS=True)
+class DatabaseMetricsRequestsTests(TransactionTestCase):
+    """
+    Тесты изменения метрик между запросами. Соединение проверяется
+    только вне транзакции, поэтому тесты не оборачиваются в неё
+    """
+
+    url = reverse('metrics-db')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(
+            email='admin@example.com', username='admin', password='password'
+        ))
+
+    def test_health_checks_are_counted(self):
+        first = self.client.get(self.url).data
+        second = self.client.get(self.url).data
+        self.assertGreater(second['health_checks'], first['health_checks'])
+        self.assertEqual(
+            second['unusable_connections'], first['unusable_connections']
+        )
+
+    def test_unusable_connections_are_counted(self):
+        first = self.client.get(self.url).data
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            second = self.client.get(self.url).data
+        self.assertEqual(
+            second['unusable_connections'] - first['unusable_connections'], 1
+        )
+
+
+class KeysetPaginationTests(APITestCase):
+    """Тесты курсорной пагинации"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password'
+        )
+        for number in range(3):
+            create_recipe(cls.user, name=f'Рецепт {number}')
+
+    def test_next_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.user)
+        # base64 от ["a", "b"], [null, 1] и [1]
+        for cursor in (
+            'WyJhIiwgImIiXQ==', 'W251bGwsIDFd', 'WzFd', 'not-base64'
+        ):
+            for url in ('/api/recipes/', '/api/recipes/feed/'):
+                with self.subTest(cursor=cursor, url=url):
+                    response = self.client.get(f'{url}?cursor={cursor}')
+                    self.assertEqual(
+                        response.status_code, status.HTTP_404_NOT_FOUND
+                    )
+
+
+class RecipeUpdateTests(APITestCase):
+    """Тесты изменения рецепта по разнице продуктов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.recipe = create_recipe(self.author)
+        for ingredient in self.ingredients[:3]:
+            IngredientInRecipe.objects.create(
+                recipe=self.recipe, ingredient=ingredient, amount=10
+            )
+        self.client.force_authenticate(self.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_rows(self):
+        return {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=self.recipe)
+        }
+
+    def test_ingredients_are_updated_by_diff(self):
+        kept, changed, removed, added = self.ingredients
+        before = self.get_rows()
+        response = self.client.patch(self.url, {'ingredients': [
+            {'id': kept.id, 'amount': 10},
+            {'id': changed.id, 'amount': 25},
+            {'id': added.id, 'amount': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        after = self.get_rows()
+        self.assertEqual(set(after), {kept.id, changed.id, added.id})
+        self.assertEqual(after[kept.id].id, before[kept.id].id)
+        self.assertEqual(after[changed.id].id, before[changed.id].id)
+        self.assertEqual(after[changed.id].amount, 25)
+        self.assertEqual(after[added.id].amount, 5)
+        self.assertFalse(
+            IngredientInRecipe.objects.filter(id=before[removed.id].id)
+            .exists()
+        )
+
+    def test_partial_update_without_ingredients(self):
+        before = {
+            ingredient_id: (row.id, row.amount)
+            for ingredient_id, row in self.get_rows().items()
+        }
+        response = self.client.patch(
+            self.url, {'name': 'Новое название'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Новое название')
+        self.assertEqual(len(response.data['ingredients']), 3)
+        self.assertEqual(
+            {
+                ingredient_id: (row.id, row.amount)
+                for ingredient_id, row in self.get_rows().items()
+            },
+            before
+        )
+
+
+class BulkRelationsTests(APITestCase):
+    """Тесты массового изменения избранного, корзины и подписок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', password='password'
+            )
+            for number in range(3)
+        ]
+        cls.recipes = [
+            create_recipe(cls.authors[0], name=f'Рецепт {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def change(self, method, url, ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                url, {'ids': ids}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['status'] for item in response.data['results']]
+
+    def test_recipes(self):
+        present, added, missing = (recipe.id for recipe in self.recipes)
+        ids = [added, present, 999999]
+        for model, url in (
+            (Favorite, '/api/recipes/favorite/bulk/'),
+            (ShoppingCart, '/api/recipes/shopping_cart/bulk/'),
+        ):
+            with self.subTest(url=url):
+                model.objects.create(user=self.user, recipe_id=present)
+                self.assertEqual(
+                    self.change('post', url, ids),
+                    ['added', 'exists', 'not_found']
+                )
+                self.assertEqual(
+                    self.change('delete', url, [added, missing, 999999]),
+                    ['removed', 'missing', 'not_found']
+                )
+                self.assertEqual(
+                    set(model.objects.filter(user=self.user)
+                        .values_list('recipe_id', flat=True)),
+                    {present}
+                )
+        self.assertEqual(
+            dict(Recipe.objects.values_list('id', 'favorites_count')),
+            {present: 1, added: 0, missing: 0}
+        )
+
+    def test_subscriptions(self):
+        url = '/api/users/subscribe/bulk/'
+        present, added, missing = (author.id for author in self.authors)
+        Subscription.objects.create(user=self.user, author_id=present)
+        self.assertEqual(
+            self.change('post', url, [added, present, self.user.id, 999999]),
+            ['added', 'exists', 'not_found', 'not_found']
+        )
+        self.assertEqual(
+            self.change('delete', url, [present, missing]),
+            ['removed', 'missing']
+        )
+        self.assertEqual(
+            dict(User.objects.values_list('id', 'subscribers_count')),
+            {self.user.id: 0, present: 0, added: 1, missing: 0}
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).subscriptions_count, 1
+        )
+
+
+class RecipeConditionalGetTests(APITestCase):
+    """Тесты ETag выдачи рецептов"""
+
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password'
+        )
+        cls.other = User.objects.create_user(
+            email='other@example.com', username='other', password='password'
+        )
+        cls.recipe = create_recipe(cls.other)
+
+    def get_etag(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get(self.url)['ETag']
+
+    def add_favorite(self, user):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{self.recipe.id}/favorite/'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_not_modified(self):
+        etag = self.get_etag(self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_other_user_favorite_keeps_etag(self):
+        etag = self.get_etag(self.user)
+        self.add_favorite(self.other)
+        self.assertEqual(self.get_etag(self.user), etag)
+
+    def test_own_favorite_changes_etag(self):
+        etag = self.get_etag(self.user)
+        self.add_favorite(self.user)
+        self.assertNotEqual(self.get_etag(self.user), etag)
+
+    def test_if_modified_since_is_ignored(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_popularity_ordering_has_no_etag(self):
+        response = self.client.get(f'{self.url}?ordering=popular')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
@@ -1,20 +1,32 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
+from .async_views import async_view
 from .views import (
+    DatabaseMetricsView,
     UserViewSet,
     IngredientViewSet,
     RecipeViewSet,
 )
 
+# Маршруты, которые в режиме asgi обслуживаются в пуле потоков
+ASYNC_ROUTES = {'recipes-list', 'ingredients-list', 'ingredients-detail'}
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='users')
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
+router_urls = router.urls
+if settings.SERVER_MODE == 'asgi':
+    for pattern in router_urls:
+        if pattern.name in ASYNC_ROUTES:
+            pattern.callback = async_view(pattern.callback)
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics/db/', DatabaseMetricsView.as_view(), name='metrics-db'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
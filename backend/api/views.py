@@ -1,28 +1,67 @@
-from django.http import FileResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.fields import BooleanField
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes.cache import cache_stream, shopping_cart_cache_key
+from recipes.connections import get_connection_metrics
 from recipes.models import (
     Favorite,
     Ingredient,
+    IngredientInRecipe,
     Recipe,
     ShoppingCart,
     Subscription,
     User
 )
+from recipes.feed import get_feed
+from recipes.pantry import pantry_index
+from recipes.relations import (
+    add_user_recipes,
+    lock_user_relations,
+    remove_user_recipes,
+    subscribe,
+    unsubscribe,
+)
+from recipes.search import search_ingredients
+from recipes.trending import bump_trending
+from recipes.versions import INGREDIENTS, RECIPES
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-
-from .pagination import PagesPagination
+from rest_framework.views import APIView
+
+from .exporters import EXPORTERS
+from .filters import (
+    RECIPE_ORDERINGS,
+    RecipeFilterBackend,
+    RecipeOrderingBackend,
+    get_ids,
+    get_recipe_ordering,
+)
+from .mixins import ConditionalGetMixin, ReadReplicaMixin
+from .negotiation import IgnoreFormatContentNegotiation
+from .pagination import FeedPagination, KeysetPagination, PagesPagination
 from .serializers import (
+    BulkIdsSerializer,
     IngredientSerializer,
     RecipeSerializer,
     ShortRecipeSerializer,
@@ -32,7 +71,38 @@ from .serializers import (
 )
 
 
-class UserViewSet(DjoserUserViewSet):
+# Статусы элементов массового запроса: изменён и уже был в нужном состоянии
+BULK_STATUSES = {
+    'POST': ('added', 'exists'),
+    'DELETE': ('removed', 'missing'),
+}
+
+
+def get_bulk_ids(request):
+    """Функция для чтения списка идентификаторов массового запроса"""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def get_bulk_response(request, ids, found, changed):
+    """
+    Функция для ответа на массовый запрос с результатом по каждому
+    идентификатору: not_found для несуществующих объектов
+    """
+    changed_status, unchanged_status = BULK_STATUSES[request.method]
+    changed = set(changed)
+    return Response({'results': [
+        {'id': pk, 'status': (
+            'not_found' if pk not in found
+            else changed_status if pk in changed
+            else unchanged_status
+        )}
+        for pk in ids
+    ]})
+
+
+class UserViewSet(ReadReplicaMixin, DjoserUserViewSet):
     """ViewSet, описывающий работу с пользователями и подписками"""
 
     queryset = User.objects.all()
@@ -93,54 +163,99 @@ class UserViewSet(DjoserUserViewSet):
             )
 
         if request.method == 'POST':
-            _, created = Subscription.objects.get_or_create(
-                user=request.user,
-                author=author
-            )
+            with transaction.atomic():
+                lock_user_relations(request.user)
+                subscription, created = Subscription.objects.get_or_create(
+                    user=request.user,
+                    author=author
+                )
 
             if not created:
                 raise ValidationError({'errors': 'Подписка уже была оформлена'})
 
             return Response(
-                SubscriptionSerializer(Subscription.objects.get(
-                    user=request.user,
-                    author=author
-                )).data,
+                SubscriptionSerializer(subscription).data,
                 status=status.HTTP_201_CREATED
             )
 
-        get_object_or_404(
-            Subscription,
-            user=request.user,
-            author=author
-        ).delete()
+        with transaction.atomic():
+            lock_user_relations(request.user)
+            get_object_or_404(
+                Subscription,
+                user=request.user,
+                author=author
+            ).delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'], url_path='subscriptions')
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_subscribe_and_unsubscribe(self, request):
+        """
+        Метод для подписки на нескольких авторов или отписки от них
+        одним запросом. На самого себя подписаться нельзя, такой
+        идентификатор получает статус not_found
+        """
+        ids = get_bulk_ids(request)
+        with transaction.atomic():
+            found = User.objects.only('id').in_bulk(ids).keys()
+            found = found - {request.user.id}
+            change = subscribe if request.method == 'POST' else unsubscribe
+            changed = change(request.user, [pk for pk in ids if pk in found])
+        return get_bulk_response(request, ids, found, changed)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='subscriptions',
+        permission_classes=[IsAuthenticated]
+    )
     def subscriptions(self, request):
         """
         Метод для вывода всех авторов,
         на которых подписан пользователь
         """
 
-        user = request.user
+        recipes = Recipe.objects.order_by('-created_at', '-id')
+        try:
+            recipes_limit = int(request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        if recipes_limit is not None:
+            # Ограничение количества рецептов каждого автора
+            # коррелированным подзапросом с LIMIT
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .order_by('-created_at', '-id')
+                .values('id')[:max(recipes_limit, 0)]
+            ))
+
         subscriptions = (
-            user.users.all()
+            request.user.users
             .select_related('author')
+            .prefetch_related(Prefetch(
+                'author__recipes',
+                queryset=recipes,
+                to_attr='limited_recipes'
+            ))
         )
 
         # Пагинация
-        paginator = PageNumberPagination()
-        paginator.page_size = request.query_params.get('limit', 6)
+        paginator = FeedPagination()
+        paginator.keyset_ordering = ('-id',)
         paginated_subscriptions = paginator.paginate_queryset(
-            subscriptions,
+            subscriptions.order_by('-id'),
             request
         )
 
-        authors = [
-            subscription.author for subscription in paginated_subscriptions
-        ]
+        authors = []
+        for subscription in paginated_subscriptions:
+            subscription.author.is_subscribed = True
+            authors.append(subscription.author)
 
         serializer = SubscribedUserSerializer(
             authors,
@@ -150,33 +265,69 @@ class UserViewSet(DjoserUserViewSet):
         return paginator.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReadReplicaMixin,
+    ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """ViewSet, описывающий работу с ингредиентами"""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
+    version_tables = (INGREDIENTS,)
+    vary_on_user = False
 
-    def get_queryset(self):
+    def list(self, request, *args, **kwargs):
         """Метод для получения ингредиентов по имени"""
-        name = self.request.query_params.get('name')
-        if name:
-            return self.queryset.filter(name__istartswith=name.lower())
-        return self.queryset
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return Response(
+            self.get_serializer(search_ingredients(name), many=True).data
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ReadReplicaMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet
+):
     """ViewSet, описывающий работу с рецептами"""
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
-    pagination_class = PagesPagination
+    pagination_class = FeedPagination
+    filter_backends = [RecipeFilterBackend, RecipeOrderingBackend]
+    version_tables = (RECIPES,)
+
+    @property
+    def keyset_ordering(self):
+        """Курсорная пагинация идёт в порядке выбранной сортировки"""
+        return get_recipe_ordering(self.request)
+
+    def get_version_tables(self, request):
+        # Порядок по популярности меняется с каждым добавлением
+        # в избранное или корзину любым пользователем, а версия
+        # рецептов от этого не зависит
+        if get_recipe_ordering(request) != RECIPE_ORDERINGS['newest']:
+            return None
+        return super().get_version_tables(request)
 
     def get_queryset(self):
         """Метод для получения рецептов"""
 
-        queryset = super().get_queryset()
+        queryset = self._annotate_user_flags(
+            super().get_queryset()
+            .select_related('author')
+            .prefetch_related(Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ))
+        )
         author_id = self.request.query_params.get('author')
         is_favorited = self.request.query_params.get('is_favorited')
         is_in_shopping_cart = self.request.query_params.get(
@@ -192,6 +343,31 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return queryset
 
+    def _annotate_user_flags(self, queryset):
+        """
+        Метод для вычисления флагов избранного, корзины и подписки
+        одним запросом вместо отдельного запроса на каждый рецепт
+        """
+        user = self.request.user
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_subscribed_to_author=false,
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed_to_author=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
     def perform_create(self, serializer):
         """Метод для автоматического указания автора рецепта"""
         serializer.save(author=self.request.user)
@@ -203,26 +379,51 @@ class RecipeViewSet(viewsets.ModelViewSet):
         в списке избранных или в корзине покупок
         """
         if request.method == 'POST':
-            _, created = model.objects.get_or_create(
-                user=request.user,
-                recipe=recipe
-            )
-            if not created:
-                raise ValidationError({'errors': 'Рецепт уже добавлен'})
+            with transaction.atomic():
+                lock_user_relations(request.user)
+                relation, created = model.objects.get_or_create(
+                    user=request.user,
+                    recipe=recipe
+                )
+                if not created:
+                    raise ValidationError({'errors': 'Рецепт уже добавлен'})
+                bump_trending([(recipe.id, relation.created_at)], model)
 
             return Response(
                 ShortRecipeSerializer(recipe).data,
                 status=status.HTTP_201_CREATED
             )
 
-        get_object_or_404(
-            model,
-            user=request.user,
-            recipe=recipe
-        ).delete()
+        with transaction.atomic():
+            lock_user_relations(request.user)
+            relation = get_object_or_404(
+                model,
+                user=request.user,
+                recipe=recipe
+            )
+            relation.delete()
+            bump_trending([(recipe.id, relation.created_at)], model, sign=-1)
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def _bulk_favorite_or_shopping_cart(request, model):
+        """
+        Метод для добавления и удаления нескольких рецептов
+        в списке избранных или в корзине покупок одним запросом
+        """
+        ids = get_bulk_ids(request)
+        with transaction.atomic():
+            found = Recipe.objects.only('id').in_bulk(ids).keys()
+            change = (
+                add_user_recipes if request.method == 'POST'
+                else remove_user_recipes
+            )
+            changed = change(
+                model, request.user, [pk for pk in ids if pk in found]
+            )
+        return get_bulk_response(request, ids, found, changed)
+
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
     def change_favorited_recipes(self, request, pk=None):
         """Метод для добавления или удаления рецепта из избранного"""
@@ -232,6 +433,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             Favorite
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_change_favorited_recipes(self, request):
+        """Метод для добавления или удаления рецептов из избранного"""
+        return self._bulk_favorite_or_shopping_cart(request, Favorite)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -245,66 +456,161 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ShoppingCart
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_change_shopping_cart(self, request):
+        """Метод для добавления или удаления рецептов из списка покупок"""
+        return self._bulk_favorite_or_shopping_cart(request, ShoppingCart)
+
     @action(
         detail=False,
         methods=['get'],
-        url_path='download_shopping_cart'
+        url_path='feed',
+        permission_classes=[IsAuthenticated]
     )
-    def download_shopping_cart(self, request):
-        """Метод для загрузки текстового отчета со списком покупок"""
-
-        ingredient_totals = {}
-        recipe_names = {}
-
-        for item in (request.user.shoppingcarts.all()
-                .select_related('recipe')):
-            recipe_names[item.recipe.name] = item.recipe.author.username
-            for ingredient_in_recipe in item.recipe.recipe_ingredients.all():
-                key = (
-                    ingredient_in_recipe.ingredient.name,
-                    ingredient_in_recipe.ingredient.measurement_unit
-                )
-                ingredient_totals[key] = (ingredient_totals.get(key, 0)
-                                          + ingredient_in_recipe.amount)
+    def feed(self, request):
+        """
+        Метод для вывода рецептов авторов, на которых подписан
+        пользователь, от новых к старым с курсорной пагинацией
+        """
+        def fetch(cursor, size):
+            recipe_ids = get_feed(request.user, cursor, size)
+            recipes = self.get_queryset().in_bulk(recipe_ids)
+            return [
+                recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes
+            ]
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_with(fetch, request, Recipe)
+        return paginator.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
 
-        report_text = self._render_shopping_cart(
-            ingredient_totals,
-            recipe_names,
-            timezone.now().strftime('%d.%m.%Y')
+    @action(detail=False, methods=['get'], url_path='pantry')
+    def pantry(self, request):
+        """
+        Метод для подбора рецептов по продуктам, которые есть
+        у пользователя. Рецепты упорядочены по доле продуктов рецепта,
+        которые у пользователя есть
+        """
+        ingredient_ids = get_ids(request, 'ingredients')
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите продукты, которые у вас есть'}
+            )
+        recipe_ids, coverage, matched, totals = pantry_index.match(
+            ingredient_ids
         )
 
-        return FileResponse(
-            report_text,
-            content_type='text/plain',
-            filename='shopping_cart.txt'
+        paginator = PagesPagination()
+        page = paginator.paginate_queryset(
+            range(len(recipe_ids)), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [int(recipe_ids[position]) for position in page]
         )
+        results = []
+        for position in page:
+            recipe = recipes.get(int(recipe_ids[position]))
+            if recipe is None:
+                continue
+            data = self.get_serializer(recipe).data
+            data['coverage'] = round(float(coverage[position]), 3)
+            data['matched_count'] = int(matched[position])
+            data['missing_count'] = int(totals[position] - matched[position])
+            results.append(data)
+        return paginator.get_paginated_response(results)
 
-    def _render_shopping_cart(self, ingredient_totals, recipe_names, date):
-        """Метод для формирования текста списка покупок"""
-        report_lines = [
-            f'Список покупок на {date}:',
-            'Продукты:',
-        ]
-
-        for number_of_product, ((name, unit), amount) in enumerate(
-            sorted(ingredient_totals.items(), key=lambda x: x[0]),
-            start=1
-        ):
-            report_lines.append(
-                f'{number_of_product}. '
-                f'{name.capitalize()} ({unit}) - {amount}'
-            )
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='download_shopping_cart',
+        permission_classes=[IsAuthenticated],
+        content_negotiation_class=IgnoreFormatContentNegotiation
+    )
+    def download_shopping_cart(self, request):
+        """
+        Метод для загрузки списка покупок в формате,
+        указанном в параметре format
+        """
 
-        report_lines.append('\nРецепты, для которых нужны эти продукты:')
-        for number_of_product, (recipe_name, author) in enumerate(
-            sorted(recipe_names.items()),
-            start=1
-        ):
-            report_lines.append(
-                f'{number_of_product}. {recipe_name} (автор: {author})'
+        export_format = request.query_params.get('format', 'txt')
+        exporter_class = EXPORTERS.get(export_format)
+        if exporter_class is None:
+            raise ValidationError({
+                'format': f'Доступные форматы: {", ".join(EXPORTERS)}'
+            })
+
+        date = timezone.now().strftime('%d.%m.%Y')
+        cache_key = shopping_cart_cache_key(
+            request.user.id, export_format, date
+        )
+        cached_file = cache.get(cache_key)
+        if cached_file is not None:
+            response = HttpResponse(
+                cached_file, content_type=exporter_class.content_type
+            )
+        else:
+            ingredient_totals = (
+                IngredientInRecipe.objects
+                .filter(recipe__shoppingcarts__user=request.user)
+                .values(
+                    name=F('ingredient__name'),
+                    measurement_unit=F('ingredient__measurement_unit')
+                )
+                .annotate(amount=Sum('amount'))
+                .order_by('name', 'measurement_unit')
+            )
+            recipe_names = (
+                Recipe.objects
+                .filter(shoppingcarts__user=request.user)
+                .values_list('name', 'author__username')
+                .order_by('name')
+            )
+            exporter = exporter_class(
+                ingredient_totals.iterator(),
+                recipe_names.iterator(),
+                date
+            )
+            response = StreamingHttpResponse(
+                cache_stream(exporter.render(), cache_key),
+                content_type=exporter_class.content_type
             )
 
-        return '\n'.join(report_lines)
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename="shopping_cart.{exporter_class.extension}"'
+        )
+        return response
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        """
+        Метод для вывода рецептов, которые добавляют в избранное
+        и корзину те же пользователи, что и этот рецепт
+        """
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = PagesPagination.page_size
+        recipes = list(
+            self.get_queryset()
+            .filter(similar_to__recipe_id=pk)
+            .annotate(similarity=F('similar_to__score'))
+            .order_by('-similarity', '-id')[:max(limit, 0)]
+        )
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+        return Response([
+            {**self.get_serializer(similar).data,
+             'similarity': round(similar.similarity, 3)}
+            for similar in recipes
+        ])
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
@@ -313,3 +619,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
             reverse('recipes:recipe-short-link', args=[pk])
         )
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
+
+
+class DatabaseMetricsView(APIView):
+    """
+    View с метриками соединений с БД процесса, обработавшего запрос:
+    оборот соединений, проверки и ожидание пула потоков
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_connection_metrics())
@@ -78,11 +78,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Режим сервера: wsgi — синхронные воркеры gunicorn, asgi — воркеры uvicorn.
+# В режиме asgi чтение рецептов и продуктов выполняется в пуле потоков,
+# а не в единственном потоке, общем для синхронных представлений
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+# Размер пула потоков одного воркера; у каждого потока своё соединение с БД
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 16))
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Сколько секунд соединение с БД живёт между запросами;
+# 0 — новое соединение на каждый запрос
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
 
 DATABASES = {
     'default': {
@@ -93,10 +104,102 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
     }
 }
 
+# Для локальных замеров и бенчмарков можно работать без Postgres:
+# DB_ENGINE=sqlite3 переключает проект на файл SQLite
+if os.getenv('DB_ENGINE') == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+
+# Реплики для чтения через запятую: хосты Postgres в DB_REPLICA_HOSTS
+# или пути к копиям файла SQLite в SQLITE_REPLICA_PATHS. Остальные
+# параметры подключения у реплик такие же, как у основной БД
+if os.getenv('DB_ENGINE') == 'sqlite3':
+    _replica_key, _replicas = 'NAME', os.getenv('SQLITE_REPLICA_PATHS', '')
+else:
+    _replica_key, _replicas = 'HOST', os.getenv('DB_REPLICA_HOSTS', '')
+DATABASE_REPLICAS = []
+for _number, _replica in enumerate(filter(None, _replicas.split(',')), 1):
+    DATABASES[f'replica{_number}'] = {
+        **DATABASES['default'],
+        _replica_key: _replica.strip(),
+        # В тестах реплики указывают на тестовую основную БД
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['recipes.replicas.ReplicaRouter']
+
+# Проверка постоянных соединений перед запросом: соединение, разорванное
+# базой данных, закрывается и открывается заново, а не падает на запросе
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    },
+    # Общая для всех пользователей часть выдачи рецептов.
+    # LocMemCache при переполнении вытесняет давно не читавшиеся записи
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', 'foodgram-recipes'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECIPE_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+# Время хранения сформированных файлов списка покупок в кэше
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Шрифт с поддержкой кириллицы для выгрузки списка покупок в PDF
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Поиск продуктов для автодополнения: memory — индекс в памяти процесса,
+# database — запрос к базе с триграммным индексом в Postgres
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND', 'memory')
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Конфигурация полнотекстового поиска рецептов в Postgres. В остальных
+# базах рецепты ищутся по инвертированному индексу в памяти процесса
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', 'russian')
+
+# Лента рецептов подписок. Рецепты авторов, у которых подписчиков больше
+# FEED_FANOUT_LIMIT, не копируются в ленты, а читаются при запросе ленты
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+# Сколько записей хранится в ленте одного пользователя
+FEED_MAX_ENTRIES = 1000
+# Сколько последних рецептов автора добавляется в ленту при подписке
+FEED_BACKFILL = 20
+
+# Сколько похожих рецептов хранится для каждого рецепта
+SIMILAR_RECIPES_TOP_K = 20
+
+# Наибольшее число идентификаторов в одном массовом запросе
+BULK_MAX_ITEMS = 100
+
+# За сколько часов вклад добавления в избранное в популярность
+# рецепта уменьшается вдвое
+TRENDING_HALF_LIFE_HOURS = 72
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -140,6 +243,23 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 STATICFILES_DIRS = []
 
+# Ограничения на картинки, загружаемые строкой base64.
+# Размер совпадает с client_max_body_size в nginx
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 25_000_000
+IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Уменьшенные копии картинок рецептов в формате WebP:
+# название варианта и наибольшая сторона в пикселях
+IMAGE_VARIANTS = {
+    'small': 320,
+    'medium': 800,
+}
+IMAGE_VARIANTS_QUALITY = 80
+# Количество фоновых потоков обработки, 0 — обработка сразу после
+# сохранения в том же потоке, что удобно для тестов и команд управления
+IMAGE_VARIANTS_WORKERS = int(os.getenv('IMAGE_VARIANTS_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -27,27 +27,15 @@ class UserAdmin(UserAdmin):
         return 'Нет аватара'
     get_avatar_display.short_description = 'Аватар'
 
-    def get_recipe_count(self, obj):
-        return obj.recipes.count()
-    get_recipe_count.short_description = 'Рецептов'
-
-    def get_subscriptions_count(self, obj):
-        return obj.users.count()
-    get_subscriptions_count.short_description = 'Подписок'
-
-    def get_subscribers_count(self, obj):
-        return obj.authors.count()
-    get_subscribers_count.short_description = 'Подписчиков'
-
     list_display = (
         'id',
         'username',
         'get_full_name_display',
         'email',
         'get_avatar_display',
-        'get_recipe_count',
-        'get_subscriptions_count',
-        'get_subscribers_count',
+        'recipes_count',
+        'subscriptions_count',
+        'subscribers_count',
     )
     search_fields = ('username', 'email')
     ordering = ('id',)
@@ -89,16 +77,12 @@ class RecipeAdmin(admin.ModelAdmin):
         return 'Нет изображения'
     get_image_display.short_description = 'Картинка'
 
-    def get_favorites_count(self, obj):
-        return obj.favorites.count()
-    get_favorites_count.short_description = 'В избранном'
-
     list_display = (
         'id',
         'name',
         'cooking_time',
         'author',
-        'get_favorites_count',
+        'favorites_count',
         'get_ingredients_display',
         'get_image_display',
     )
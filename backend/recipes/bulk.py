@@ -0,0 +1,182 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, models
+from django.utils import timezone
+
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+)
+
+# Таблицы в порядке загрузки: сначала те, на которые ссылаются другие
+TABLES = {
+    model._meta.model_name: model
+    for model in (
+        Ingredient, Recipe, IngredientInRecipe, Favorite, ShoppingCart
+    )
+}
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def get_columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def export_table(model, file, batch_size=1000):
+    """
+    Функция для выгрузки таблицы в CSV со строкой заголовка.
+    В Postgres данные передаются командой COPY прямо в файл,
+    в остальных СУБД читаются курсором частями
+    """
+    columns = get_columns(model)
+    select = (
+        f'SELECT {", ".join(map(_quote, columns))} '
+        f'FROM {_quote(model._meta.db_table)} '
+        f'ORDER BY {_quote(model._meta.pk.column)}'
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.copy_expert(
+                f'COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER)', file
+            )
+            return
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        cursor.execute(select)
+        while rows := cursor.fetchmany(batch_size):
+            writer.writerows(
+                (
+                    '' if value is None else value
+                    for value in row
+                )
+                for row in rows
+            )
+
+
+def _read_header(model, file):
+    """Функция для чтения и проверки строки заголовка CSV"""
+    columns = next(csv.reader([file.readline()]), [])
+    unknown = set(columns) - set(get_columns(model))
+    if unknown or model._meta.pk.column not in columns:
+        raise ValueError(
+            f'Неверный заголовок файла таблицы {model._meta.db_table}: '
+            f'{", ".join(columns)}'
+        )
+    return columns
+
+
+def _upsert_sql(model, columns, source):
+    pk = model._meta.pk.column
+    updates = ', '.join(
+        f'{_quote(column)} = EXCLUDED.{_quote(column)}'
+        for column in columns if column != pk
+    )
+    return (
+        f'INSERT INTO {_quote(model._meta.db_table)} '
+        f'({", ".join(map(_quote, columns))}) {source} '
+        f'ON CONFLICT ({_quote(pk)}) DO '
+        + (f'UPDATE SET {updates}' if updates else 'NOTHING')
+    )
+
+
+def _copy_from(model, columns, file):
+    """
+    Функция для загрузки CSV в Postgres: COPY во временную таблицу,
+    затем вставка с обновлением существующих строк.
+    Временная таблица удаляется при фиксации транзакции
+    """
+    staging = _quote(f'staging_{model._meta.db_table}')
+    quoted = ', '.join(map(_quote, columns))
+    # Пустое значение без кавычек COPY считает NULL, для
+    # обязательных текстовых полей это должна быть пустая строка
+    not_null = [
+        _quote(field.column) for field in model._meta.concrete_fields
+        if field.column in columns and not field.null
+        and isinstance(
+            field, (models.CharField, models.TextField, models.FileField)
+        )
+    ]
+    options = 'FORMAT csv' + (
+        f', FORCE_NOT_NULL ({", ".join(not_null)})' if not_null else ''
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {staging} '
+            f'(LIKE {_quote(model._meta.db_table)} INCLUDING DEFAULTS) '
+            f'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            f'COPY {staging} ({quoted}) FROM STDIN WITH ({options})', file
+        )
+        cursor.execute(_upsert_sql(
+            model, columns, f'SELECT {quoted} FROM {staging}'
+        ))
+        return cursor.rowcount
+
+
+def _converter(field):
+    """Функция для приведения значения из CSV к значению для базы данных"""
+    def convert(value):
+        if value == '' and field.null:
+            return None
+        if isinstance(field, models.JSONField):
+            value = json.loads(value)
+        value = field.to_python(value)
+        # SQLite хранит время в UTC без часового пояса
+        if isinstance(field, models.DateTimeField) and timezone.is_naive(
+            value
+        ):
+            value = timezone.make_aware(value, timezone.utc)
+        return field.get_db_prep_save(value, connection)
+    return convert
+
+
+def _execute_many(model, columns, file, batch_size):
+    """Функция для загрузки CSV пакетами через executemany"""
+    fields = {
+        field.column: field for field in model._meta.concrete_fields
+    }
+    converters = [_converter(fields[column]) for column in columns]
+    sql = _upsert_sql(
+        model, columns, f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    rows = csv.reader(file)
+    loaded = 0
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, batch_size)):
+            cursor.executemany(sql, [
+                [convert(value) for convert, value in zip(converters, row)]
+                for row in batch
+            ])
+            loaded += len(batch)
+    return loaded
+
+
+def import_table(model, file, batch_size=1000):
+    """
+    Функция для загрузки таблицы из CSV со строкой заголовка.
+    Строки с уже существующим первичным ключом обновляются.
+    Возвращает количество загруженных строк
+    """
+    columns = _read_header(model, file)
+    if connection.vendor == 'postgresql':
+        return _copy_from(model, columns, file)
+    return _execute_many(model, columns, file, batch_size)
+
+
+def reset_sequences(models_to_reset):
+    """Функция для сдвига последовательностей за максимальный ключ"""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), models_to_reset
+        ):
+            cursor.execute(sql)
@@ -0,0 +1,85 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+from .versions import (
+    bump_table_versions,
+    get_table_versions,
+    shopping_cart_table,
+)
+
+INVALIDATE_BATCH_SIZE = 500
+
+
+def get_shopping_cart_version(user_id):
+    """Функция для получения версии корзины покупок пользователя"""
+    [(version, _)] = get_table_versions([shopping_cart_table(user_id)])
+    return version
+
+
+def invalidate_shopping_carts(user_ids):
+    """Функция для сброса закэшированных списков покупок"""
+    tables = map(shopping_cart_table, user_ids)
+    while batch := list(islice(tables, INVALIDATE_BATCH_SIZE)):
+        bump_table_versions(*batch)
+
+
+def invalidate_shopping_carts_on_commit(user_ids):
+    """
+    Функция для сброса списков покупок после фиксации транзакции,
+    чтобы параллельный запрос не закэшировал под новой версией
+    ещё не зафиксированное содержимое корзины
+    """
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_shopping_carts(user_ids))
+
+
+def shopping_cart_cache_key(user_id, export_format, date):
+    return (
+        f'shopping_cart:{user_id}:{get_shopping_cart_version(user_id)}:'
+        f'{export_format}:{date}'
+    )
+
+
+def cache_stream(chunks, key):
+    """
+    Функция для передачи частей файла клиенту
+    с сохранением итогового файла в кэш
+    """
+    rendered = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        rendered.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(rendered), settings.SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def get_recipe_fragment(recipe_id, version):
+    """
+    Функция для получения общей для всех пользователей
+    части выдачи рецепта, если она построена для той же версии
+    """
+    cached = caches['recipes'].get(f'recipe:{recipe_id}')
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    return None
+
+
+def set_recipe_fragment(recipe_id, version, data):
+    caches['recipes'].set(f'recipe:{recipe_id}', (version, data))
+
+
+def invalidate_recipe_fragments(recipe_ids):
+    """Функция для удаления закэшированной выдачи рецептов"""
+    caches['recipes'].delete_many(
+        [f'recipe:{recipe_id}' for recipe_id in recipe_ids]
+    )
+
+
+def clear_recipe_fragments():
+    """Функция для удаления всей закэшированной выдачи рецептов"""
+    caches['recipes'].clear()
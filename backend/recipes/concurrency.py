@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .connections import check_connections, record_pool_wait
+
+# Синхронный код асинхронных представлений не зависит от потока,
+# поэтому запросы обрабатываются параллельно в ограниченном пуле.
+# При DB_CONN_MAX_AGE больше нуля каждый поток держит постоянное
+# соединение, и пул потоков служит пулом соединений с БД
+executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEW_THREADS,
+    thread_name_prefix='async-view'
+)
+
+
+def run_in_thread_pool(func):
+    """
+    Функция для превращения синхронной функции в асинхронную, которая
+    выполняется в пуле потоков. Сигналы начала и конца запроса проверяют
+    соединения с БД только в потоке обработчика, поэтому соединения
+    потоков пула проверяются здесь
+    """
+    def call(submitted, *args, **kwargs):
+        record_pool_wait((time.perf_counter() - submitted) * 1000)
+        close_old_connections()
+        check_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    run = sync_to_async(call, thread_sensitive=False, executor=executor)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(time.perf_counter(), *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,74 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+_lock = threading.Lock()
+_metrics = {
+    'connections_created': 0,
+    'health_checks': 0,
+    'unusable_connections': 0,
+    'pool_waits': 0,
+    'pool_wait_ms_total': 0.0,
+    'pool_wait_ms_max': 0.0,
+}
+
+
+def count_connection_created():
+    """Функция для подсчёта новых соединений с БД, то есть их оборота"""
+    with _lock:
+        _metrics['connections_created'] += 1
+
+
+def record_pool_wait(wait_ms):
+    """Функция для учёта ожидания свободного потока пула с соединением"""
+    with _lock:
+        _metrics['pool_waits'] += 1
+        _metrics['pool_wait_ms_total'] += wait_ms
+        _metrics['pool_wait_ms_max'] = max(
+            _metrics['pool_wait_ms_max'], wait_ms
+        )
+
+
+def check_connections():
+    """
+    Функция для проверки постоянных соединений текущего потока перед
+    запросом. Соединение, разорванное базой данных или сетью,
+    закрывается, и Django откроет новое при первом обращении
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        usable = connection.is_usable()
+        with _lock:
+            _metrics['health_checks'] += 1
+            _metrics['unusable_connections'] += not usable
+        if not usable:
+            connection.close()
+
+
+def get_connection_metrics():
+    """
+    Функция для получения метрик соединений текущего процесса.
+    У каждого воркера сервера свои метрики
+    """
+    with _lock:
+        metrics = dict(_metrics)
+    metrics['pool_wait_ms_avg'] = (
+        metrics['pool_wait_ms_total'] / metrics['pool_waits']
+        if metrics['pool_waits'] else 0.0
+    )
+    return {
+        'pid': os.getpid(),
+        'server_mode': settings.SERVER_MODE,
+        'conn_max_age': settings.DB_CONN_MAX_AGE,
+        'health_checks_enabled': settings.DB_CONN_HEALTH_CHECKS,
+        'pool_size': settings.ASYNC_VIEW_THREADS,
+        **{
+            key: round(value, 2) if isinstance(value, float) else value
+            for key, value in metrics.items()
+        },
+    }
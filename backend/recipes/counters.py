@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, Subscription, User
+
+# Счётчик: модель, поле счётчика, модель связи и поле связи
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscriptions_count', Subscription, 'user'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+
+def change_counter(model, pks, field, delta):
+    """Функция для атомарного изменения счётчика через F-выражение"""
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def reconcile_counters():
+    """
+    Функция для исправления расхождений счётчиков с фактическими данными.
+    Возвращает количество исправленных записей по каждому счётчику
+    """
+    repaired = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = Coalesce(
+            Subquery(
+                related_model.objects
+                .filter(**{related_field: OuterRef('pk')})
+                .values(related_field)
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            Value(0)
+        )
+        repaired[f'{model._meta.model_name}.{field}'] = (
+            model.objects.annotate(actual=actual)
+            .filter(~Q(**{field: F('actual')}))
+            .update(**{field: actual})
+        )
+    return repaired
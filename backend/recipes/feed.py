@@ -0,0 +1,151 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import FeedEntry, Recipe, Subscription, User
+
+BATCH_SIZE = 1000
+
+
+def _add_entries(entries):
+    """Функция для вставки записей в ленты пакетами"""
+    entries = iter(entries)
+    while batch := list(islice(entries, BATCH_SIZE)):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _is_fanout_author(author_id):
+    """
+    Функция проверяет, копируются ли рецепты автора в ленты подписчиков.
+    Рецепты авторов с большим числом подписчиков читаются при запросе ленты
+    """
+    return User.objects.filter(
+        pk=author_id, subscribers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).exists()
+
+
+def fan_out_recipe(recipe_id):
+    """Функция для добавления нового рецепта в ленты подписчиков автора"""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'created_at'
+    ).first()
+    if recipe is None or not _is_fanout_author(recipe['author_id']):
+        return
+    _add_entries(
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            created_at=recipe['created_at']
+        )
+        for user_id in Subscription.objects.filter(
+            author_id=recipe['author_id']
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Функция для добавления последних рецептов автора в ленту подписчика"""
+    if not _is_fanout_author(author_id):
+        return
+    _add_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id, created_at=created_at)
+        for recipe_id, created_at in
+        Recipe.objects.filter(author_id=author_id)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:settings.FEED_BACKFILL]
+    )
+
+
+def remove_authors_from_feed(user_id, author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def _seek(cursor, recipe_field):
+    """Условие «строго после курсора» для сортировки от новых к старым"""
+    if cursor is None:
+        return Q()
+    created_at, recipe_id = cursor
+    return Q(created_at__lt=created_at) | Q(
+        created_at=created_at, **{f'{recipe_field}__lt': recipe_id}
+    )
+
+
+def get_feed(user, cursor, size):
+    """
+    Функция для получения страницы ленты пользователя: идентификаторов
+    рецептов от новых к старым после курсора (дата создания, id).
+    Из ленты и из рецептов каждого автора с большим числом подписчиков
+    читается не больше одной страницы, поэтому время чтения не зависит
+    от числа подписок
+    """
+    rows = set(
+        FeedEntry.objects.filter(user=user)
+        .filter(_seek(cursor, 'recipe_id'))
+        .order_by('-created_at', '-recipe_id')
+        .values_list('created_at', 'recipe_id')[:size]
+    )
+    for author_id in user.users.filter(
+        author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True):
+        rows.update(
+            Recipe.objects.filter(author_id=author_id)
+            .filter(_seek(cursor, 'id'))
+            .order_by('-created_at', '-id')
+            .values_list('created_at', 'id')[:size]
+        )
+    return [recipe_id for _, recipe_id in sorted(rows, reverse=True)[:size]]
+
+
+def trim_feeds(max_entries=None):
+    """
+    Функция для удаления из лент записей сверх FEED_MAX_ENTRIES.
+    Возвращает количество удалённых записей
+    """
+    max_entries = max_entries or settings.FEED_MAX_ENTRIES
+    deleted = 0
+    for user_id in (
+        FeedEntry.objects.values('user_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=max_entries)
+        .values_list('user_id', flat=True)
+    ):
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        last = entries.order_by('-created_at', '-recipe_id').values_list(
+            'created_at', 'recipe_id'
+        )[max_entries - 1]
+        deleted += entries.filter(_seek(last, 'recipe_id')).delete()[0]
+    return deleted
+
+
+def rebuild_feeds():
+    """
+    Функция для заполнения лент по текущим подпискам, например после
+    массовой загрузки подписок, которая не вызывает сигналы.
+    Возвращает количество удалённых лишних записей
+    """
+    for author_id in (
+        User.objects.filter(
+            subscribers_count__gt=0,
+            subscribers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('id', flat=True).iterator()
+    ):
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-created_at', '-id')
+            .values_list('id', 'created_at')[:settings.FEED_MAX_ENTRIES]
+        )
+        if not recipes:
+            continue
+        _add_entries(
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id, created_at=created_at
+            )
+            for user_id in Subscription.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True).iterator()
+            for recipe_id, created_at in recipes
+        )
+    return trim_feeds()
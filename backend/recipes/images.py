@@ -0,0 +1,111 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .cache import invalidate_recipe_fragments
+from .models import Recipe
+from .versions import RECIPES, bump_table_versions
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANTS_WORKERS,
+                thread_name_prefix='image-variants'
+            )
+    return _executor
+
+
+def get_variant_name(source_name, variant):
+    return f'{os.path.splitext(source_name)[0]}_{variant}.webp'
+
+
+def build_variants(source_name):
+    """
+    Функция для создания уменьшенных копий картинки в формате WebP.
+    Возвращает словарь с именами созданных файлов
+    """
+    variants = {}
+    with default_storage.open(source_name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            buffer = io.BytesIO()
+            resized.save(
+                buffer, 'WEBP', quality=settings.IMAGE_VARIANTS_QUALITY
+            )
+            name = get_variant_name(source_name, variant)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[variant] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def _delete_files(names):
+    for name in names:
+        if name and default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def process_recipe_image(recipe_id, source_name, previous_variants):
+    """Функция для обработки картинки рецепта вне запроса"""
+    try:
+        variants = build_variants(source_name)
+        # Картинка могла смениться, пока шла обработка
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=source_name
+        ).update(image_variants={'source': source_name, **variants})
+        if not updated:
+            _delete_files(variants.values())
+            return
+        _delete_files(
+            name for variant, name in previous_variants.items()
+            if variant != 'source' and name not in variants.values()
+        )
+        invalidate_recipe_fragments([recipe_id])
+        bump_table_versions(RECIPES)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать картинку рецепта %s', recipe_id
+        )
+    finally:
+        if settings.IMAGE_VARIANTS_WORKERS:
+            connections.close_all()
+
+
+def schedule_recipe_image(recipe):
+    """
+    Функция для постановки картинки рецепта в очередь обработки
+    после фиксации транзакции, если варианты ещё не построены
+    """
+    if not recipe.image or (
+        recipe.image_variants.get('source') == recipe.image.name
+    ):
+        return
+    arguments = (recipe.id, recipe.image.name, dict(recipe.image_variants))
+    if not settings.IMAGE_VARIANTS_WORKERS:
+        transaction.on_commit(lambda: process_recipe_image(*arguments))
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(process_recipe_image, *arguments)
+    )
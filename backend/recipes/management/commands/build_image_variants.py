@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Построение уменьшенных копий картинок рецептов, у которых их нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def _process(self, recipe):
+        try:
+            process_recipe_image(*recipe)
+        finally:
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        recipes = [
+            (pk, image, variants)
+            for pk, image, variants in
+            Recipe.objects.values_list('id', 'image', 'image_variants')
+            .iterator()
+            if image and variants.get('source') != image
+        ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            list(executor.map(self._process, recipes))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(recipes)}'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.similarity import compute_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчёт похожих рецептов по избранному и корзинам. По умолчанию "
+        "пересчитываются только рецепты, затронутые изменениями"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты'
+        )
+        parser.add_argument('--top-k', type=int)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        computed = compute_similarities(
+            full=options['full'],
+            top_k=options['top_k'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {computed} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
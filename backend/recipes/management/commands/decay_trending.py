@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from recipes.trending import decay_trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчёт популярности рецептов с затуханием по избранному "
+        "и корзинам. Команду нужно запускать периодически, "
+        "например раз в сутки"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {decay_trending()}'
+        ))
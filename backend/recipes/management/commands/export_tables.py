@@ -0,0 +1,31 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.bulk import TABLES, export_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузка таблиц рецептов, продуктов, избранного и корзин в CSV. "
+        "В Postgres используется COPY"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для CSV-файлов')
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(TABLES), default=list(TABLES)
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        for name in options['tables']:
+            path = os.path.join(options['directory'], f'{name}.csv')
+            started = time.perf_counter()
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                export_table(TABLES[name], file, options['batch_size'])
+            self.stdout.write(
+                f'{name}: {path} за {time.perf_counter() - started:.1f} с'
+            )
+        self.stdout.write(self.style.SUCCESS('Выгрузка завершена'))
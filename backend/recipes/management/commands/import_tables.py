@@ -0,0 +1,72 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.bulk import TABLES, import_table, reset_sequences
+from recipes.cache import (
+    clear_recipe_fragments,
+    invalidate_shopping_carts,
+)
+from recipes.counters import reconcile_counters
+from recipes.feed import rebuild_feeds
+from recipes.models import ShoppingCart
+from recipes.versions import INGREDIENTS, RECIPES, bump_table_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка таблиц из CSV, выгруженных командой export_tables. "
+        "Строки с существующим ключом обновляются. В Postgres данные "
+        "загружаются COPY через временные таблицы"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с CSV-файлами')
+        parser.add_argument(
+            '--tables', nargs='+', choices=list(TABLES), default=list(TABLES)
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Размер пакета, если СУБД не поддерживает COPY'
+        )
+
+    def handle(self, *args, **options):
+        # Порядок загрузки определяется внешними ключами, а не аргументами
+        names = [name for name in TABLES if name in options['tables']]
+        paths = {
+            name: os.path.join(options['directory'], f'{name}.csv')
+            for name in names
+        }
+        for path in paths.values():
+            if not os.path.exists(path):
+                raise CommandError(f'Файл {path} не найден.')
+
+        with transaction.atomic():
+            for name, path in paths.items():
+                started = time.perf_counter()
+                with open(path, encoding='utf-8', newline='') as file:
+                    try:
+                        loaded = import_table(
+                            TABLES[name], file, options['batch_size']
+                        )
+                    except ValueError as error:
+                        raise CommandError(error)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{name}: загружено строк {loaded} за {elapsed:.1f} с '
+                    f'({loaded / max(elapsed, 1e-6):.0f} строк/с)'
+                )
+            reset_sequences([TABLES[name] for name in names])
+
+        # COPY и массовая вставка не вызывают сигналы
+        reconcile_counters()
+        # Ленты строятся по обновлённым счётчикам подписчиков
+        rebuild_feeds()
+        invalidate_shopping_carts(
+            ShoppingCart.objects.values_list('user_id', flat=True)
+            .distinct().iterator()
+        )
+        clear_recipe_fragments()
+        bump_table_versions(INGREDIENTS, RECIPES)
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
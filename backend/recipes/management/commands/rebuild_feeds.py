@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import rebuild_feeds
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполнение лент рецептов по текущим подпискам, например "
+        "после массовой загрузки подписок"
+    )
+
+    def handle(self, *args, **options):
+        trimmed = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {FeedEntry.objects.count()}, '
+            f'удалено лишних: {trimmed}'
+        ))
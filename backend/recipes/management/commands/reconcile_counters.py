@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчёт счётчиков рецептов, подписок и избранного"
+
+    def handle(self, *args, **kwargs):
+        for counter, repaired in reconcile_counters().items():
+            self.stdout.write(f'{counter}: исправлено записей {repaired}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
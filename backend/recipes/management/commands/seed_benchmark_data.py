@@ -0,0 +1,214 @@
+import csv
+import json
+import os
+import random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from recipes.counters import reconcile_counters
+from recipes.feed import rebuild_feeds
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    User,
+)
+from recipes.versions import INGREDIENTS, RECIPES, bump_table_versions
+
+BENCH_PREFIX = 'bench'
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерация синтетических данных для бенчмарков: пользователи, "
+        "рецепты и подписки масштабируются из файлов каталога data"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--subscriptions', type=int, default=1000)
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='Количество избранных рецептов и рецептов в корзине '
+                 'у каждого пользователя'
+        )
+        parser.add_argument(
+            '--data-dir', default=os.path.join(settings.BASE_DIR, 'data')
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее сгенерированных пользователей и их рецепты'
+        )
+
+    def handle(self, *args, **options):
+        data_dir = options['data_dir']
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=f'{BENCH_PREFIX}_'
+            ).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+
+        ingredients = self._seed_ingredients(data_dir)
+        users = self._seed_users(data_dir, options['users'])
+        recipes = self._seed_recipes(
+            data_dir, options['recipes'], users, ingredients
+        )
+        self._seed_subscriptions(users, options['subscriptions'])
+        self._seed_user_recipes(users, recipes, options['favorites'])
+        # Массовая вставка не вызывает сигналы, обновляющие счётчики и ленты
+        reconcile_counters()
+        rebuild_feeds()
+        bump_table_versions(INGREDIENTS, RECIPES)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Сгенерировано: пользователей {len(users)}, '
+            f'рецептов {len(recipes)}'
+        ))
+
+    def _seed_ingredients(self, data_dir):
+        with open(
+            os.path.join(data_dir, 'ingredients.csv'), encoding='utf-8'
+        ) as file:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in csv.reader(file)
+                ),
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
+        return {
+            name: pk
+            for pk, name in Ingredient.objects.values_list('id', 'name')
+        }
+
+    def _seed_users(self, data_dir, count):
+        with open(
+            os.path.join(data_dir, 'users.json'), encoding='utf-8'
+        ) as file:
+            templates = json.load(file)
+        # Хэширование пароля дорогое, поэтому хэш общий для всех
+        password = make_password(f'{BENCH_PREFIX}-password')
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'{BENCH_PREFIX}{number}_{template["email"]}',
+                    username=f'{BENCH_PREFIX}_{number}',
+                    first_name=template['first_name'],
+                    last_name=template['last_name'],
+                    password=password,
+                )
+                for number, template in (
+                    (number, templates[number % len(templates)])
+                    for number in range(count)
+                )
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        return list(
+            User.objects.filter(username__startswith=f'{BENCH_PREFIX}_')
+            .order_by('id')
+            .values_list('id', flat=True)[:count]
+        )
+
+    def _copy_image(self, data_dir, image_name):
+        name = f'recipes/images/{BENCH_PREFIX}_{image_name}'
+        if not default_storage.exists(name):
+            with open(os.path.join(data_dir, 'images', image_name), 'rb') as f:
+                name = default_storage.save(name, File(f))
+        return name
+
+    def _seed_recipes(self, data_dir, count, users, ingredients):
+        with open(
+            os.path.join(data_dir, 'recipes.json'), encoding='utf-8'
+        ) as file:
+            templates = json.load(file)
+        images = {
+            template['image']: self._copy_image(data_dir, template['image'])
+            for template in templates
+        }
+        existing = Recipe.objects.filter(author__in=users).count()
+        recipes = [
+            Recipe(
+                name=f'{template["name"]} #{number}',
+                text=template['text'],
+                image=images[template['image']],
+                author_id=self.random.choice(users),
+                cooking_time=int(template['cooking_time']),
+            )
+            for number, template in (
+                (number, templates[number % len(templates)])
+                for number in range(existing, count)
+            )
+        ]
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        recipe_ids = list(
+            Recipe.objects.filter(author__in=users)
+            .order_by('id')
+            .values_list('id', 'name')
+        )
+        templates_by_name = {
+            template['name']: template for template in templates
+        }
+        IngredientInRecipe.objects.bulk_create(
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredients[item['name']],
+                    amount=item['amount'],
+                )
+                for recipe_id, name in recipe_ids
+                for item in templates_by_name[
+                    name.rsplit(' #', 1)[0]
+                ]['ingredients']
+                if item['name'] in ingredients
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        return [recipe_id for recipe_id, _ in recipe_ids]
+
+    def _random_pairs(self, left, right, count):
+        pairs = set()
+        limit = len(left) * len(right)
+        while len(pairs) < min(count, limit):
+            pairs.add((self.random.choice(left), self.random.choice(right)))
+        return pairs
+
+    def _seed_subscriptions(self, users, count):
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user_id=user, author_id=author)
+                for user, author in self._random_pairs(users, users, count)
+                if user != author
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def _seed_user_recipes(self, users, recipes, per_user):
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user, recipe_id=recipe)
+                    for user in users
+                    for recipe in self.random.sample(
+                        recipes, min(per_user, len(recipes))
+                    )
+                ),
+                batch_size=self.batch_size,
+                ignore_conflicts=True
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import trim_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаление из лент рецептов записей сверх FEED_MAX_ENTRIES. "
+        "Команду нужно запускать периодически"
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей лент: {trim_feeds()}'
+        ))
@@ -4,7 +4,26 @@ from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """
+    Миксин для моделей со счётчиками. Счётчики меняются только
+    F-выражениями, поэтому обычное сохранение загруженной записи
+    не перезаписывает их устаревшими значениями
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель пользователей"""
 
     email = models.EmailField(
@@ -34,6 +53,31 @@ class User(AbstractUser):
 
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
 
+    # Счётчики поддерживаются сигналами, чтобы не считать их при чтении
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False
+    )
+
+    subscriptions_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+        editable=False
+    )
+
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False
+    )
+
+    counter_fields = (
+        'recipes_count',
+        'subscriptions_count',
+        'subscribers_count',
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
         'username',
@@ -111,7 +155,7 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецептов"""
 
     name = models.CharField(
@@ -133,6 +177,14 @@ class Recipe(models.Model):
         upload_to = 'recipes/images/'
     )
 
+    # Уменьшенные копии картинки строятся в фоне после сохранения
+    image_variants = models.JSONField(
+        verbose_name='Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+
     author = models.ForeignKey(
         User,
         on_delete = models.CASCADE,
@@ -153,11 +205,82 @@ class Recipe(models.Model):
         verbose_name='Дата создания'
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+
+    # Популярность с затуханием во времени, см. recipes.trending
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последнее время',
+        default=0,
+        editable=False
+    )
+
+    # Флаг выставляется при изменении избранного и корзин
+    # и сбрасывается после пересчёта похожих рецептов
+    similarities_outdated = models.BooleanField(
+        verbose_name='Похожие рецепты устарели',
+        default=True,
+        editable=False
+    )
+
+    # Увеличивается при каждой пометке: флаг сбрасывается, только если
+    # рецепт не менялся с начала пересчёта похожих рецептов
+    similarities_version = models.PositiveIntegerField(
+        verbose_name='Версия похожих рецептов',
+        default=0,
+        editable=False
+    )
+
+    # Поля, которые меняются только запросами update
+    counter_fields = (
+        'favorites_count', 'trending_score', 'similarities_outdated',
+        'similarities_version',
+    )
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created_at',)
         default_related_name = 'recipes'
+        indexes = [
+            # Индекс для курсорной пагинации ленты рецептов
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx'
+            ),
+            # Индекс для выборки последних рецептов каждого автора
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='recipe_author_created_at_idx'
+            ),
+            # Индексы для сортировок по популярности
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_idx'
+            ),
+            # Индекс для фильтра по времени приготовления
+            models.Index(
+                fields=['cooking_time', '-created_at', '-id'],
+                name='recipe_cooking_time_idx'
+            ),
+            # Индекс для обновления индексов рецептов в памяти процессов
+            models.Index(
+                fields=['updated_at'],
+                name='recipe_updated_at_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'ID рецепта: {self.id} | {self.name}'
@@ -195,6 +318,13 @@ class IngredientInRecipe(models.Model):
                 name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            # Индекс для поиска рецептов по продуктам без чтения таблицы
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='ingredient_recipe_idx'
+            ),
+        ]
         default_related_name = 'recipe_ingredients'
 
     def __str__(self):
@@ -217,6 +347,12 @@ class UserOfRecipeBase(models.Model):
         verbose_name='Рецепт',
         related_name='%(class)ss'
     )
+    # Нужна, чтобы при удалении вычесть из популярности рецепта
+    # ровно тот вклад, который был добавлен, см. recipes.trending
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     '''К сожалению я узнал, что default_related_name в Meta, 
     не поддерживает динамическое указание названия related_name,
@@ -249,3 +385,147 @@ class ShoppingCart(UserOfRecipeBase):
     class Meta:
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзины покупок'
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Модель похожих рецептов: для каждого рецепта хранится
+    ограниченное число самых похожих по избранному и корзинам
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similarity'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='recipe_similarity_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.similar_id}: {self.score:.3f}'
+
+
+class FeedEntry(models.Model):
+    """
+    Модель записи в ленте подписчика. Новый рецепт добавляется в ленты
+    всех подписчиков автора при публикации, поэтому лента читается
+    по индексу без перебора подписок
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+
+    # Копия даты создания рецепта для сортировки ленты без соединения
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания рецепта'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created_at', '-recipe'],
+                name='feed_entry_user_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте {self.user_id}'
+
+
+class TableVersion(models.Model):
+    """
+    Модель счётчиков версий таблиц. Версия увеличивается при каждом
+    изменении данных и используется для условных GET-запросов
+    """
+
+    table = models.CharField(
+        verbose_name='Таблица',
+        max_length=64,
+        unique=True
+    )
+
+    version = models.PositiveBigIntegerField(
+        verbose_name='Версия',
+        default=0
+    )
+
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+
+    def __str__(self):
+        return f'{self.table}: {self.version}'
+
+
+class RecipeDeletion(models.Model):
+    """
+    Модель журнала удалённых рецептов. По нему индексы рецептов
+    в памяти процессов узнают об удалениях без перебора всех рецептов
+    """
+
+    recipe_id = models.PositiveIntegerField(
+        verbose_name='Рецепт'
+    )
+
+    deleted_at = models.DateTimeField(
+        verbose_name='Дата удаления',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id} удалён {self.deleted_at}'
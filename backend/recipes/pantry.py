@@ -0,0 +1,98 @@
+import numpy as np
+
+from .models import IngredientInRecipe
+from .search import RecipeIndex
+
+
+class PantryIndex(RecipeIndex):
+    """
+    Индекс продуктов рецептов для подбора рецептов по продуктам,
+    которые есть у пользователя. Продукты всех рецептов хранятся
+    в одном массиве отсортированными отрезками по рецептам, поэтому
+    покрытие считается векторно сразу по всему каталогу
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._recipes = {}
+        self._recipe_ids = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.int64)
+        self._ingredients = np.empty(0, dtype=np.int64)
+        self._rows = np.empty(0, dtype=np.int64)
+
+    def load(self, recipes):
+        recipes = dict(recipes.values_list('id', 'updated_at'))
+        ingredients = {recipe_id: [] for recipe_id in recipes}
+        for recipe_id, ingredient_id in (
+            IngredientInRecipe.objects
+            .filter(recipe_id__in=recipes.keys())
+            .values_list('recipe_id', 'ingredient_id')
+            .iterator()
+        ):
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id, updated_at in recipes.items():
+            yield recipe_id, updated_at, ingredients[recipe_id]
+
+    def add(self, recipe_id, ingredient_ids):
+        self._recipes[recipe_id] = np.unique(
+            np.array(ingredient_ids, dtype=np.int64)
+        )
+
+    def remove(self, recipe_id):
+        self._recipes.pop(recipe_id, None)
+
+    def rebuild(self):
+        """
+        Метод для сборки общих массивов индекса. Массивы заменяются
+        целиком, поэтому уже начатый подбор работает со старой копией
+        """
+        recipe_ids = np.fromiter(self._recipes, dtype=np.int64)
+        lengths = np.fromiter(
+            (len(ingredients) for ingredients in self._recipes.values()),
+            dtype=np.int64, count=len(self._recipes)
+        )
+        self._ingredients = (
+            np.concatenate(list(self._recipes.values()))
+            if self._recipes else np.empty(0, dtype=np.int64)
+        )
+        # Номер рецепта для каждого продукта в общем массиве
+        self._rows = np.repeat(np.arange(len(recipe_ids)), lengths)
+        self._recipe_ids = recipe_ids
+        self._lengths = lengths
+
+    def match(self, ingredient_ids):
+        """
+        Метод для подбора рецептов по имеющимся продуктам. Возвращает
+        массивы рецептов, их покрытия, количества найденных и всех
+        продуктов, отсортированные по убыванию покрытия, затем
+        по возрастанию количества недостающих продуктов
+        """
+        with self._lock:
+            self.refresh()
+            recipe_ids = self._recipe_ids
+            lengths = self._lengths
+            ingredients = self._ingredients
+            rows = self._rows
+
+        size = int(ingredients.max()) + 1 if len(ingredients) else 0
+        wanted = np.fromiter(ingredient_ids, dtype=np.int64)
+        have = np.zeros(size, dtype=bool)
+        have[wanted[(wanted >= 0) & (wanted < size)]] = True
+
+        matched = np.bincount(
+            rows[have[ingredients]], minlength=len(recipe_ids)
+        )
+        found = np.flatnonzero(matched)
+        coverage = matched[found] / lengths[found]
+        order = np.lexsort((
+            -recipe_ids[found],
+            lengths[found] - matched[found],
+            -coverage,
+        ))
+        found = found[order]
+        return (
+            recipe_ids[found], coverage[order], matched[found], lengths[found]
+        )
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,125 @@
+from django.db import transaction
+
+from .cache import invalidate_shopping_carts_on_commit
+from .counters import change_counter
+from .feed import backfill_feed
+from .models import Favorite, Recipe, Subscription, User
+from .similarity import mark_outdated
+from .trending import bump_trending
+from .versions import bump_table_versions_on_commit, user_relations_table
+
+# Массовые изменения избранного, корзин и подписок. bulk_create
+# не вызывает сигналы, поэтому при добавлении счётчики, версии, кэши
+# и ленты обновляются здесь. Удаление идёт через QuerySet.delete(),
+# и те же данные обновляют обработчики post_delete в recipes.signals
+
+
+def lock_user_relations(user):
+    """
+    Функция для блокировки избранного, корзины и подписок пользователя
+    до конца транзакции. Все изменения идут под блокировкой строки
+    пользователя, поэтому найденные заранее записи не меняются
+    до вставки, и счётчики меняются ровно на число вставленных строк
+    """
+    list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+
+
+def _user_recipes_added(model, user, recipe_ids):
+    if not recipe_ids:
+        return
+    if model is Favorite:
+        change_counter(Recipe, recipe_ids, 'favorites_count', 1)
+    else:
+        invalidate_shopping_carts_on_commit([user.id])
+    mark_outdated(recipe_ids)
+    bump_table_versions_on_commit(user_relations_table(user.id))
+
+
+@transaction.atomic
+def add_user_recipes(model, user, recipe_ids):
+    """
+    Функция для добавления рецептов в избранное или корзину.
+    Возвращает идентификаторы рецептов, которых там ещё не было
+    """
+    lock_user_relations(user)
+    existing = set(
+        model.objects.filter(user=user, recipe_id__in=recipe_ids)
+        .values_list('recipe_id', flat=True)
+    )
+    added = [
+        recipe_id for recipe_id in recipe_ids if recipe_id not in existing
+    ]
+    relations = model.objects.bulk_create(
+        model(user=user, recipe_id=recipe_id) for recipe_id in added
+    )
+    _user_recipes_added(model, user, added)
+    bump_trending(
+        [(relation.recipe_id, relation.created_at) for relation in relations],
+        model
+    )
+    return added
+
+
+@transaction.atomic
+def remove_user_recipes(model, user, recipe_ids):
+    """
+    Функция для удаления рецептов из избранного или корзины.
+    Возвращает идентификаторы рецептов, которые там были
+    """
+    lock_user_relations(user)
+    relations = list(
+        model.objects.select_for_update()
+        .filter(user=user, recipe_id__in=recipe_ids)
+        .values_list('recipe_id', 'created_at')
+    )
+    removed = [recipe_id for recipe_id, _ in relations]
+    model.objects.filter(user=user, recipe_id__in=removed).delete()
+    bump_trending(relations, model, sign=-1)
+    return removed
+
+
+@transaction.atomic
+def subscribe(user, author_ids):
+    """
+    Функция для подписки на авторов.
+    Возвращает идентификаторы авторов, на которых не было подписки
+    """
+    lock_user_relations(user)
+    existing = set(
+        Subscription.objects.filter(user=user, author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+    added = [
+        author_id for author_id in author_ids if author_id not in existing
+    ]
+    if not added:
+        return added
+    Subscription.objects.bulk_create(
+        Subscription(user=user, author_id=author_id) for author_id in added
+    )
+    change_counter(User, [user.id], 'subscriptions_count', len(added))
+    change_counter(User, added, 'subscribers_count', 1)
+
+    def backfill():
+        for author_id in added:
+            backfill_feed(user.id, author_id)
+
+    transaction.on_commit(backfill)
+    bump_table_versions_on_commit(user_relations_table(user.id))
+    return added
+
+
+@transaction.atomic
+def unsubscribe(user, author_ids):
+    """
+    Функция для отписки от авторов.
+    Возвращает идентификаторы авторов, на которых была подписка
+    """
+    lock_user_relations(user)
+    removed = list(
+        Subscription.objects.select_for_update()
+        .filter(user=user, author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+    Subscription.objects.filter(user=user, author_id__in=removed).delete()
+    return removed
@@ -0,0 +1,61 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Состояние текущего запроса: можно ли читать с реплик и была ли запись.
+# Словарь общий для копий контекста, которые создаёт sync_to_async,
+# поэтому запись в любом потоке запроса закрепляет его за основной БД
+_state = ContextVar('replica_state', default=None)
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """
+    Контекстный менеджер, внутри которого чтение идёт с реплик,
+    пока в нём не было записи
+    """
+    token = _state.set({'enabled': enabled, 'pinned': False})
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Роутер, направляющий чтение внутри use_replicas на случайную реплику
+    из DATABASE_REPLICAS. Запись и всё чтение после неё в том же запросе,
+    а также чтение внутри транзакции идут в основную БД, поэтому запрос
+    видит собственные изменения
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            not settings.DATABASE_REPLICAS
+            or state is None
+            or not state['enabled']
+            or state['pinned']
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['pinned'] = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплики репликацией с основной БД
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,274 @@
+import json
+import re
+import threading
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredient, Recipe, RecipeDeletion
+from .versions import INGREDIENTS, RECIPES, get_table_versions
+
+
+class IngredientIndex:
+    """
+    Индекс продуктов в памяти процесса для автодополнения.
+    Названия хранятся отсортированными, поэтому продукты с нужным
+    префиксом находятся двоичным поиском без обращения к базе
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._entries = []
+
+    def _refresh(self):
+        # Версия хранится в базе, поэтому индекс перестраивается
+        # и после загрузки продуктов management-командами
+        [(version, _)] = get_table_versions([INGREDIENTS])
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            entries = sorted(
+                (name.lower(), pk, name, measurement_unit)
+                for pk, name, measurement_unit in
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            )
+            self._keys = [entry[0] for entry in entries]
+            self._entries = entries
+            self._version = version
+
+    def search(self, query, limit):
+        """
+        Метод для поиска продуктов: сначала совпадения по началу
+        названия, затем совпадения по подстроке
+        """
+        self._refresh()
+        keys, entries = self._keys, self._entries
+        query = query.lower()
+
+        found = []
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys)
+            and len(found) < limit
+            and keys[position].startswith(query)
+        ):
+            found.append(entries[position])
+            position += 1
+
+        if len(found) < limit:
+            for entry in entries:
+                if query in entry[0] and not entry[0].startswith(query):
+                    found.append(entry)
+                    if len(found) == limit:
+                        break
+
+        return [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients_in_database(query, limit):
+    """
+    Функция для поиска продуктов средствами базы данных
+    с тем же порядком выдачи, что и у индекса в памяти
+    """
+    return list(
+        Ingredient.objects
+        .filter(name__icontains=query)
+        .annotate(is_substring=Case(
+            When(name__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        ))
+        .order_by('is_substring', 'name')[:limit]
+    )
+
+
+def search_ingredients(query):
+    """Функция для поиска продуктов выбранным в настройках способом"""
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    if settings.INGREDIENT_SEARCH_BACKEND == 'database':
+        return search_ingredients_in_database(query, limit)
+    return ingredient_index.search(query, limit)
+
+
+def get_words(text):
+    """Функция для разбиения текста на слова в нижнем регистре"""
+    return re.findall(r'\w+', text.lower().replace('ё', 'е'))
+
+
+class RecipeIndex:
+    """
+    Базовый класс индекса рецептов в памяти процесса. При изменении
+    версии рецептов переиндексируются только изменённые и удалённые
+    рецепты. Вызывать refresh и читать индекс нужно под блокировкой
+    """
+
+    # Рецепт сохраняется раньше, чем фиксируется его транзакция, поэтому
+    # рецепты, изменённые незадолго до прошлого обновления, проверяются снова
+    reindex_margin = timedelta(minutes=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._updated_at = None
+        self._deleted_at = None
+
+    def load(self, recipes):
+        """
+        Метод должен возвращать для рецептов из выборки тройки:
+        идентификатор, дату изменения и данные для индекса
+        """
+        raise NotImplementedError
+
+    def add(self, recipe_id, data):
+        raise NotImplementedError
+
+    def remove(self, recipe_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Метод вызывается после изменения индекса"""
+
+    def refresh(self):
+        # Версия рецептов меняется только при изменении их содержимого,
+        # а не при добавлении в избранное или корзину
+        [(version, _)] = get_table_versions([RECIPES])
+        if version == self._version:
+            return
+        # Журнал удалений читается до рецептов: рецепт, удалённый
+        # после этого, будет найден в журнале при следующем обновлении
+        deletions = RecipeDeletion.objects.order_by('deleted_at')
+        if self._deleted_at is not None:
+            deletions = deletions.filter(
+                deleted_at__gte=self._deleted_at - self.reindex_margin
+            )
+        deletions = list(deletions.values_list('recipe_id', 'deleted_at'))
+        if self._version is not None:
+            # При первой сборке удалённых рецептов в выборке уже нет
+            for recipe_id, _ in deletions:
+                self.remove(recipe_id)
+        if deletions:
+            self._deleted_at = deletions[-1][1]
+
+        recipes = Recipe.objects.all()
+        if self._updated_at is not None:
+            recipes = recipes.filter(
+                updated_at__gte=self._updated_at - self.reindex_margin
+            )
+        for recipe_id, updated_at, data in self.load(recipes):
+            self.remove(recipe_id)
+            self.add(recipe_id, data)
+            if self._updated_at is None or updated_at > self._updated_at:
+                self._updated_at = updated_at
+        self.rebuild()
+        self._version = version
+
+
+class RecipeSearchIndex(RecipeIndex):
+    """
+    Инвертированный индекс рецептов для баз данных без полнотекстового
+    поиска. Слова названия и описания хранятся отсортированными, поэтому
+    рецепты со словами, начинающимися на слово запроса, находятся
+    двоичным поиском
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._recipes = {}
+        self._words = {}
+        self._keys = []
+
+    def load(self, recipes):
+        for recipe_id, name, text, updated_at in recipes.values_list(
+            'id', 'name', 'text', 'updated_at'
+        ).iterator():
+            yield recipe_id, updated_at, f'{name} {text}'
+
+    def add(self, recipe_id, text):
+        words = set(get_words(text))
+        self._recipes[recipe_id] = words
+        for word in words:
+            self._words.setdefault(word, set()).add(recipe_id)
+
+    def remove(self, recipe_id):
+        for word in self._recipes.pop(recipe_id, ()):
+            recipes = self._words[word]
+            recipes.discard(recipe_id)
+            if not recipes:
+                del self._words[word]
+
+    def rebuild(self):
+        self._keys = sorted(self._words)
+
+    def search(self, query):
+        """
+        Метод для поиска рецептов, в названии или описании которых
+        есть слова, начинающиеся на каждое из слов запроса
+        """
+        with self._lock:
+            self.refresh()
+            found = None
+            for word in get_words(query):
+                matched = set()
+                position = bisect_left(self._keys, word)
+                while (
+                    position < len(self._keys)
+                    and self._keys[position].startswith(word)
+                ):
+                    matched.update(self._words[self._keys[position]])
+                    position += 1
+                found = matched if found is None else found & matched
+                if not found:
+                    break
+            return found or set()
+
+
+recipe_index = RecipeSearchIndex()
+
+
+def get_recipe_search_vector():
+    """
+    Функция для построения поискового вектора рецепта. Выражение должно
+    совпадать с индексом recipes_recipe_search из сигнала post_migrate
+    """
+    return SearchVector(
+        'name', 'text', config=settings.RECIPE_SEARCH_CONFIG
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Функция для полнотекстового поиска рецептов: в Postgres
+    по индексу GIN, в остальных базах по индексу в памяти
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        return queryset.annotate(
+            search=get_recipe_search_vector()
+        ).filter(search=SearchQuery(
+            query, config=settings.RECIPE_SEARCH_CONFIG,
+            search_type='websearch'
+        ))
+    recipe_ids = sorted(recipe_index.search(query))
+    if connection.vendor == 'sqlite':
+        # Один параметр вместо списка, длина которого ограничена в SQLite
+        return queryset.filter(id__in=RawSQL(
+            'SELECT value FROM json_each(%s)', [json.dumps(recipe_ids)]
+        ))
+    return queryset.filter(id__in=recipe_ids)
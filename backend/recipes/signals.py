@@ -1,13 +1,291 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import connections, transaction
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from .cache import (
+    invalidate_recipe_fragments,
+    invalidate_shopping_carts_on_commit,
+)
+from .connections import check_connections, count_connection_created
+from .counters import change_counter
+from .feed import backfill_feed, fan_out_recipe, remove_authors_from_feed
+from .images import schedule_recipe_image
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    RecipeDeletion,
+    ShoppingCart,
+    Subscription,
+)
+from .similarity import mark_outdated
+from .versions import (
+    INGREDIENTS,
+    RECIPES,
+    bump_table_versions_on_commit,
+    user_relations_table,
+)
+
 User = get_user_model()
 
+# Поля пользователя, которые попадают в выдачу рецептов
+USER_PROFILE_FIELDS = {'username', 'first_name', 'last_name', 'avatar'}
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Создание профиля пользователя при регистрации"""
     if created:
         # Здесь можно добавить дополнительную логику при создании пользователя
-        pass 
\ No newline at end of file
+        pass
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def reset_shopping_cart(sender, instance, **kwargs):
+    """Сброс кэша списка покупок при изменении корзины"""
+    invalidate_shopping_carts_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+def reset_shopping_carts_with_recipe(sender, instance, **kwargs):
+    """Сброс кэша списков покупок, в которых есть изменённый рецепт"""
+    invalidate_shopping_carts_on_commit(
+        ShoppingCart.objects.filter(recipe=instance)
+        .values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def reset_shopping_carts_with_recipe_ingredient(sender, instance, **kwargs):
+    """Сброс кэша списков покупок при изменении продуктов рецепта"""
+    invalidate_shopping_carts_on_commit(
+        ShoppingCart.objects.filter(recipe_id=instance.recipe_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def reset_shopping_carts_with_ingredient(sender, instance, **kwargs):
+    """Сброс кэша списков покупок при переименовании продукта"""
+    invalidate_shopping_carts_on_commit(
+        ShoppingCart.objects.filter(recipe__ingredients=instance)
+        .values_list('user_id', flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=User)
+def reset_shopping_carts_with_author(sender, instance, update_fields,
+                                     **kwargs):
+    """Сброс кэша списков покупок при смене имени автора рецептов"""
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    invalidate_shopping_carts_on_commit(
+        ShoppingCart.objects.filter(recipe__author=instance)
+        .values_list('user_id', flat=True).distinct()
+    )
+
+
+@receiver(post_migrate)
+def create_search_indexes(sender, using, **kwargs):
+    """
+    Создание поисковых индексов в Postgres. Триграммный индекс
+    по названию продукта ускоряет поиск по подстроке и началу названия
+    без учёта регистра, который Django строит как UPPER(name) LIKE.
+    Индекс GIN по поисковому вектору рецепта нужен полнотекстовому поиску
+    """
+    if sender.name != 'recipes':
+        return
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+            f'ON {Ingredient._meta.db_table} '
+            'USING gin (UPPER(name::text) gin_trgm_ops)'
+        )
+        # Выражение совпадает с SQL, который строит SearchVector
+        # в recipes.search.get_recipe_search_vector
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS '
+            f'recipes_recipe_search_{settings.RECIPE_SEARCH_CONFIG} '
+            f'ON {Recipe._meta.db_table} USING gin (to_tsvector('
+            "%s::regconfig, COALESCE(name, '') || ' ' || COALESCE(text, '')"
+            '))',
+            [settings.RECIPE_SEARCH_CONFIG]
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def bump_recipes_version(sender, **kwargs):
+    """Увеличение версии рецептов при изменении данных их выдачи"""
+    bump_table_versions_on_commit(RECIPES)
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deletion(sender, instance, **kwargs):
+    """Запись удалённого рецепта в журнал для индексов рецептов"""
+    RecipeDeletion.objects.create(recipe_id=instance.id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_user_relations_version(sender, instance, **kwargs):
+    """
+    Увеличение версии избранного, корзины и подписок пользователя,
+    от которых зависят флаги в его выдаче рецептов
+    """
+    bump_table_versions_on_commit(user_relations_table(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def bump_recipes_version_on_profile_change(sender, update_fields, **kwargs):
+    """Увеличение версии рецептов при изменении профиля автора"""
+    if update_fields is None or USER_PROFILE_FIELDS & set(update_fields):
+        bump_table_versions_on_commit(RECIPES)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """
+    Увеличение версий продуктов и рецептов при изменении продукта.
+    По версии продуктов перестраивается индекс автодополнения
+    """
+    bump_table_versions_on_commit(INGREDIENTS, RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reset_recipe_fragment(sender, instance, **kwargs):
+    """Сброс закэшированной выдачи изменённого рецепта"""
+    invalidate_recipe_fragments([instance.id])
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def reset_recipe_fragment_on_ingredients_change(sender, instance, **kwargs):
+    """Сброс закэшированной выдачи рецепта при изменении его продуктов"""
+    invalidate_recipe_fragments([instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def reset_author_recipe_fragments(sender, instance, update_fields, **kwargs):
+    """Сброс закэшированной выдачи рецептов при изменении профиля автора"""
+    if update_fields is None or USER_PROFILE_FIELDS & set(update_fields):
+        invalidate_recipe_fragments(
+            instance.recipes.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+def reset_ingredient_recipe_fragments(sender, instance, **kwargs):
+    """Сброс закэшированной выдачи рецептов при изменении продукта"""
+    invalidate_recipe_fragments(
+        instance.recipe_ingredients.values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    """Увеличение счётчика рецептов автора"""
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    """Уменьшение счётчика рецептов автора"""
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increase_subscription_counts(sender, instance, created, **kwargs):
+    """Увеличение счётчиков подписок и подписчиков"""
+    if created:
+        change_counter(User, [instance.user_id], 'subscriptions_count', 1)
+        change_counter(User, [instance.author_id], 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrease_subscription_counts(sender, instance, **kwargs):
+    """Уменьшение счётчиков подписок и подписчиков"""
+    change_counter(User, [instance.user_id], 'subscriptions_count', -1)
+    change_counter(User, [instance.author_id], 'subscribers_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    """Увеличение счётчика добавлений рецепта в избранное"""
+    if created:
+        change_counter(Recipe, [instance.recipe_id], 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrease_favorites_count(sender, instance, **kwargs):
+    """Уменьшение счётчика добавлений рецепта в избранное"""
+    change_counter(Recipe, [instance.recipe_id], 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(sender, instance, **kwargs):
+    """Постановка новой картинки рецепта в очередь обработки"""
+    schedule_recipe_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    """Добавление нового рецепта в ленты подписчиков после фиксации"""
+    if created:
+        transaction.on_commit(lambda: fan_out_recipe(instance.pk))
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    """Добавление последних рецептов автора в ленту нового подписчика"""
+    if created:
+        transaction.on_commit(
+            lambda: backfill_feed(instance.user_id, instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed_on_unsubscribe(sender, instance, **kwargs):
+    """Удаление рецептов автора из ленты отписавшегося пользователя"""
+    remove_authors_from_feed(instance.user_id, [instance.author_id])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def mark_similarities_outdated(sender, instance, **kwargs):
+    """Пометка похожих рецептов устаревшими до следующего пересчёта"""
+    mark_outdated([instance.recipe_id])
+
+
+@receiver(connection_created)
+def count_new_connection(sender, connection, **kwargs):
+    """Подсчёт новых соединений с БД для метрик оборота соединений"""
+    count_connection_created()
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    """Проверка постоянных соединений с БД перед обработкой запроса"""
+    check_connections()
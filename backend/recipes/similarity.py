@@ -0,0 +1,183 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from scipy import sparse
+
+from .models import Favorite, Recipe, RecipeSimilarity, ShoppingCart
+
+# Вес добавления рецепта в избранное и в корзину
+WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 0.5),
+)
+
+
+def mark_outdated(recipe_ids):
+    """
+    Функция для пометки похожих рецептов устаревшими. Версия
+    увеличивается и у уже помеченных рецептов, чтобы идущий
+    пересчёт не сбросил флаг изменения, которое он не учёл
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        similarities_outdated=True,
+        similarities_version=F('similarities_version') + 1
+    )
+
+
+def build_matrix():
+    """
+    Функция для построения разреженной матрицы «рецепт × пользователь»
+    по избранному и корзинам. Строки матрицы нормированы, поэтому
+    произведение строк равно косинусному сходству рецептов.
+    Возвращает идентификаторы рецептов строк и матрицу
+    """
+    recipes, users, weights = [], [], []
+    for model, weight in WEIGHTS:
+        pairs = np.array(
+            model.objects.values_list('recipe_id', 'user_id'),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        recipes.append(pairs[:, 0])
+        users.append(pairs[:, 1])
+        weights.append(np.full(len(pairs), weight))
+    recipes = np.concatenate(recipes)
+    users = np.concatenate(users)
+
+    recipe_ids, rows = np.unique(recipes, return_inverse=True)
+    user_ids, columns = np.unique(users, return_inverse=True)
+    # Повторяющиеся пары складываются: избранное и корзина вместе
+    matrix = sparse.csr_matrix(
+        (np.concatenate(weights), (rows, columns)),
+        shape=(len(recipe_ids), len(user_ids))
+    )
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.diags(1 / norms) @ matrix
+
+
+def get_affected_rows(recipe_ids, matrix, changed_ids):
+    """
+    Функция для поиска строк, которые нужно пересчитать после изменения
+    избранного и корзин рецептов changed_ids: сами рецепты и рецепты,
+    у которых с ними есть общие пользователи
+    """
+    changed = np.flatnonzero(np.isin(recipe_ids, changed_ids))
+    users = np.unique(matrix[changed].indices)
+    neighbours = np.unique(matrix.T.tocsr()[users].indices)
+    return np.union1d(changed, neighbours)
+
+
+def top_similar(recipe_ids, matrix, rows, top_k, batch_size):
+    """
+    Генератор пар из рецепта и его top_k самых похожих рецептов.
+    Сходство считается пакетами строк, поэтому память не зависит
+    от размера каталога
+    """
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        scores = (matrix[batch] @ transposed).tocsr()
+        for position, row in enumerate(batch):
+            begin, end = scores.indptr[position], scores.indptr[position + 1]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = columns != row
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            yield int(recipe_ids[row]), [
+                (int(recipe_ids[column]), float(value))
+                for column, value in zip(columns[order], values[order])
+            ]
+
+
+def _save(results, changed):
+    """
+    Функция для сохранения похожих рецептов. Флаги устаревания
+    сбрасываются в той же транзакции и только у записанных рецептов,
+    версия которых не изменилась с начала пересчёта, поэтому
+    при сбое или параллельных изменениях флаги не теряются
+    """
+    recipe_ids = [recipe_id for recipe_id, _ in results]
+    with transaction.atomic():
+        RecipeSimilarity.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSimilarity.objects.bulk_create(
+            RecipeSimilarity(recipe_id=recipe_id, similar_id=similar_id,
+                             score=score)
+            for recipe_id, similar in results
+            for similar_id, score in similar
+        )
+        by_version = defaultdict(list)
+        for recipe_id in recipe_ids:
+            if recipe_id in changed:
+                by_version[changed[recipe_id]].append(recipe_id)
+        for version, ids in by_version.items():
+            Recipe.objects.filter(
+                id__in=ids, similarities_version=version,
+                similarities_outdated=True
+            ).update(similarities_outdated=False)
+
+
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def compute_similarities(full=False, top_k=None, batch_size=500):
+    """
+    Функция для пересчёта похожих рецептов. По умолчанию пересчитываются
+    только рецепты с изменившимися избранным и корзинами, рецепты,
+    которые на них ссылались, и рецепты с общими с ними пользователями.
+    Возвращает количество пересчитанных рецептов
+    """
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    # Версии читаются до построения матрицы: изменения после этого
+    # увеличат версию, и флаг останется до следующего пересчёта
+    changed = dict(
+        Recipe.objects.filter(similarities_outdated=True)
+        .values_list('id', 'similarities_version')
+    )
+    changed_ids = set(changed)
+    if not full and not changed_ids:
+        return 0
+
+    recipe_ids, matrix = build_matrix()
+    if full:
+        rows = np.arange(len(recipe_ids))
+        stale = set(
+            RecipeSimilarity.objects.values_list('recipe_id', flat=True)
+            .distinct()
+        )
+    else:
+        stale = set(changed_ids)
+        for chunk in _chunks(changed_ids):
+            stale.update(
+                RecipeSimilarity.objects.filter(similar_id__in=chunk)
+                .values_list('recipe_id', flat=True)
+            )
+        rows = get_affected_rows(recipe_ids, matrix, list(stale))
+    # У рецептов, которых больше нет ни в избранном, ни в корзинах,
+    # похожих рецептов быть не может
+    for chunk in _chunks(
+        stale.union(changed_ids).difference(recipe_ids.tolist())
+    ):
+        _save([(recipe_id, []) for recipe_id in chunk], changed)
+
+    computed = 0
+    results = []
+    for item in top_similar(recipe_ids, matrix, rows, top_k, batch_size):
+        results.append(item)
+        if len(results) == batch_size:
+            _save(results, changed)
+            computed += len(results)
+            results = []
+    if results:
+        _save(results, changed)
+        computed += len(results)
+    return computed
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+from .versions import TRENDING, bump_table_versions, get_table_versions
+
+# Вклад добавления рецепта в избранное и в корзину
+WEIGHTS = {
+    Favorite: 1.0,
+    ShoppingCart: 0.5,
+}
+
+
+def _get_epoch():
+    [(_, epoch)] = get_table_versions([TRENDING])
+    if epoch is None:
+        bump_table_versions(TRENDING)
+        [(_, epoch)] = get_table_versions([TRENDING])
+    return epoch
+
+
+def _growth(epoch, moment=None):
+    """
+    Во сколько раз вклад события в момент moment больше вклада события
+    в начале отсчёта. Хранимые очки не уменьшаются со временем,
+    а новые события весят больше, поэтому порядок рецептов
+    совпадает с порядком по очкам с затуханием
+    """
+    moment = moment or timezone.now()
+    hours = (moment - epoch).total_seconds() / 3600
+    return 2 ** (hours / settings.TRENDING_HALF_LIFE_HOURS)
+
+
+def bump_trending(relations, model, sign=1):
+    """
+    Функция для изменения популярности рецептов при добавлении
+    в избранное или корзину (sign=1) и при удалении оттуда (sign=-1).
+    relations - пары из рецепта и даты добавления. Вклад считается
+    на момент добавления, поэтому при удалении вычитается ровно
+    добавленный вклад с учётом затухания, прошедшего с тех пор
+    """
+    epoch = _get_epoch()
+    increments = {}
+    for recipe_id, created_at in relations:
+        increments[recipe_id] = increments.get(recipe_id, 0) + (
+            sign * WEIGHTS[model] * _growth(epoch, created_at)
+        )
+    if not increments:
+        return
+    increment = Case(
+        *(
+            When(pk=recipe_id, then=Value(value))
+            for recipe_id, value in increments.items()
+        ),
+        output_field=FloatField()
+    )
+    Recipe.objects.filter(pk__in=increments).update(
+        trending_score=Greatest(F('trending_score') + increment, Value(0.0))
+    )
+
+
+def decay_trending(batch_size=1000):
+    """
+    Функция для переноса начала отсчёта на текущий момент: очки всех
+    рецептов пересчитываются по избранному и корзинам, чтобы не расти
+    неограниченно. Пересчёт исправляет и расхождения из-за удалений
+    в обход bump_trending, например каскадных при удалении пользователя.
+    Возвращает количество обновлённых рецептов
+    """
+    with transaction.atomic():
+        bump_table_versions(TRENDING)
+        epoch = _get_epoch()
+        scores = {}
+        for model, weight in WEIGHTS.items():
+            for recipe_id, created_at in (
+                model.objects.values_list('recipe_id', 'created_at')
+                .iterator()
+            ):
+                scores[recipe_id] = scores.get(recipe_id, 0) + (
+                    weight * _growth(epoch, created_at)
+                )
+        recipes = [
+            Recipe(id=recipe_id, trending_score=scores.get(recipe_id, 0.0))
+            for recipe_id, score in
+            Recipe.objects.values_list('id', 'trending_score').iterator()
+            if score != scores.get(recipe_id, 0.0)
+        ]
+        Recipe.objects.bulk_update(
+            recipes, ['trending_score'], batch_size=batch_size
+        )
+    return len(recipes)
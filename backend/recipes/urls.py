@@ -1,8 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import GetRecipeByShortLink
+from .concurrency import run_in_thread_pool
+from .views import get_recipe_by_short_link
 
 app_name = 'recipes'
 
+short_link_view = get_recipe_by_short_link
+if settings.SERVER_MODE == 'asgi':
+    # Запрос к БД выполняется в пуле потоков, не блокируя цикл событий
+    short_link_view = run_in_thread_pool(get_recipe_by_short_link)
+
 urlpatterns = [
-    path('api/recipes/<int:pk>/', GetRecipeByShortLink.as_view(), name='recipe-short-link'),
-] 
\ No newline at end of file
+    path(
+        'api/recipes/<int:pk>/',
+        short_link_view,
+        name='recipe-short-link'
+    ),
+]
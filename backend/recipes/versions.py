@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TableVersion
+
+RECIPES = 'recipes'
+INGREDIENTS = 'ingredients'
+# Дата изменения этой записи служит началом отсчёта для recipes.trending
+TRENDING = 'trending'
+
+
+def shopping_cart_table(user_id):
+    """
+    Функция для получения имени версии корзины покупок пользователя.
+    Версии хранятся в базе, чтобы изменения из management-команд
+    сбрасывали списки покупок во всех процессах сервера
+    """
+    return f'shopping_cart:{user_id}'
+
+
+def user_relations_table(user_id):
+    """
+    Функция для получения имени версии избранного, корзины и подписок
+    пользователя. От них зависят только флаги в выдаче самого
+    пользователя, поэтому общая версия рецептов при этом не меняется
+    """
+    return f'user_relations:{user_id}'
+
+
+def bump_table_versions(*tables):
+    """Функция для увеличения версий таблиц"""
+    tables = set(tables)
+    if not tables:
+        return
+    updated = TableVersion.objects.filter(table__in=tables).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+    if updated < len(tables):
+        TableVersion.objects.bulk_create(
+            (TableVersion(table=table, version=1) for table in tables),
+            ignore_conflicts=True
+        )
+
+
+def bump_table_versions_on_commit(*tables):
+    """
+    Функция для увеличения версий таблиц после фиксации транзакции,
+    чтобы новая версия не стала видна раньше самих данных
+    """
+    transaction.on_commit(lambda: bump_table_versions(*tables))
+
+
+def get_table_versions(tables):
+    """
+    Функция для получения версий и дат изменения таблиц.
+    Для таблиц, которые ещё не менялись, возвращается нулевая версия
+    """
+    versions = dict.fromkeys(tables, (0, None))
+    versions.update(
+        (table, (version, updated_at))
+        for table, version, updated_at in
+        TableVersion.objects.filter(table__in=tables)
+        .values_list('table', 'version', 'updated_at')
+    )
+    return [versions[table] for table in tables]
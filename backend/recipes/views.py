@@ -1,14 +1,15 @@
+from django.http import Http404
 from django.shortcuts import redirect
 from django.urls import reverse
-from rest_framework.views import APIView
 
 from .models import Recipe
 
 
-class GetRecipeByShortLink(APIView):
-    """View для обработки коротких ссылок на рецепты"""
-
-    def get(self, request, pk):
-        """Метод для перенаправления на API-эндпоинт рецепта"""
-        recipe = Recipe.objects.get(pk=pk)
-        return redirect(reverse('recipes-detail', args=[pk])) 
\ No newline at end of file
+def get_recipe_by_short_link(request, pk):
+    """
+    Представление для перенаправления с короткой ссылки на API-эндпоинт
+    рецепта. В режиме asgi выполняется в пуле потоков, см. recipes/urls.py
+    """
+    if not Recipe.objects.filter(pk=pk).exists():
+        raise Http404
+    return redirect(reverse('recipes-detail', args=[pk]))